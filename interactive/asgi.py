@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'interactive.settings')
 
 application = get_asgi_application()
+
+# start the compute workers (if enabled) with the server, not inside the first request
+from main.context import context
+context().get_pool()
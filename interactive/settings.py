@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.middleware.RecordMiddleware',
 ]
 
 ROOT_URLCONF = 'interactive.urls'
@@ -117,7 +118,59 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = None
+# Number of long-lived subprocesses that run /compute graphs, 0 computes in the request thread.
+# They are started together with the server (interactive/wsgi.py, asgi.py).
+COMPUTE_WORKERS = 0
+COMPUTE_WORKER_TIMEOUT = 60.0
+COMPUTE_WORKER_STARTUP_TIMEOUT = 120.0
+# Seconds between background pings of the idle workers (unresponsive ones are restarted), 0 disables.
+COMPUTE_WORKER_CHECK_INTERVAL = 10.0
+# Divide the cores between concurrent requests instead of giving every op all of them.
+COMPUTE_THREAD_BUDGET = True
+# Pin each worker process to a NUMA node (round robin), linux only.
+COMPUTE_NUMA_PIN = False
+
+# Admission control for /compute, None disables a limit.
+# Per request: larger graphs are rejected before anything runs.
+COMPUTE_MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+# Django refuses larger bodies before reading them.
+DATA_UPLOAD_MAX_MEMORY_SIZE = COMPUTE_MAX_UPLOAD_BYTES
+COMPUTE_MAX_REQUEST_FLOPS = 2e12
+COMPUTE_MAX_REQUEST_BYTES = 8 * 1024 * 1024 * 1024
+# Global, summed over the requests being computed: the rest waits in a queue, cheapest first.
+COMPUTE_MAX_INFLIGHT_FLOPS = 4e12
+COMPUTE_MAX_INFLIGHT_BYTES = 16 * 1024 * 1024 * 1024
+COMPUTE_QUEUE_TIMEOUT = 30.0
+
+# Number of graphs whose activations are kept, so an edit to a small part of an input
+# only recomputes what it can reach. 0 disables incremental compute.
+# The kept tensors stay alive after the response is sent and are not counted by the
+# in-flight budgets above, so COMPUTE_INCREMENTAL_CACHE_BYTES bounds them separately
+# (split between the workers when COMPUTE_WORKERS > 0). Graphs are cached per session
+# (a per tab id the page sends, see main.views.compute_session), and a session's next
+# request may go to another worker, so the cache is most useful with COMPUTE_WORKERS = 0.
+COMPUTE_INCREMENTAL_CACHE = 0
+COMPUTE_INCREMENTAL_CACHE_BYTES = 1024 * 1024 * 1024
+# Also run every incrementally updated node in full and fail if the results differ (slow).
+COMPUTE_INCREMENTAL_VERIFY = False
+
+# Conv2d/MaxPool2d/ReLU layers whose output is larger than this many pixels along H or W
+# are computed in tiles of this size, which bounds their temporary memory. 0 disables tiling.
+# Tiling does not shrink the outputs, which are all kept and sent back: vgg16 features on a
+# 3x2048x2048 input is ~2.6e12 flops and ~9.6 GB, over the default COMPUTE_MAX_REQUEST_FLOPS
+# and COMPUTE_MAX_REQUEST_BYTES. Raise those (and the in-flight budgets) to serve such inputs.
+COMPUTE_TILE_SIZE = 0
+
+# Activation galleries built by manage.py build_gallery, each becomes a 'gallery:<name>' node.
+GALLERY_DIR = BASE_DIR / "static/galleries"
+
+# Record /compute requests for manage.py replay_compute, None disables recording.
+COMPUTE_RECORD_LOG = None
+# Fraction of requests recorded.
+COMPUTE_RECORD_SAMPLE = 1.0
+# Larger request bodies are not recorded, and recording stops once the log reaches the max size.
+COMPUTE_RECORD_MAX_BODY = 64 * 1024 * 1024
+COMPUTE_RECORD_MAX_BYTES = 1024 * 1024 * 1024
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'interactive.settings')
 
 application = get_wsgi_application()
+
+# start the compute workers (if enabled) with the server, not inside the first request
+from main.context import context
+context().get_pool()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+from contextlib import contextmanager
+import heapq
+import itertools
+import threading
+import time
+import logging
+from django.conf import settings
+
+from main.cost import Estimate
+
+logger = logging.getLogger(__name__)
+
+# status is the HTTP status to answer with: 413 for a request that is over a per-request
+# budget and fails the same way on every retry, 429 for one that may fit later.
+class AdmissionError(Exception):
+    def __init__(self, message: str, status: int = 429):
+        super().__init__(message)
+        self.status = status
+
+
+class Ticket:
+    def __init__(self, estimate: Estimate):
+        self.estimate = estimate
+        self.cancelled = False
+
+
+# Per-request budgets reject a graph outright. The global budgets cap the sum over the
+# requests being computed; a request that does not fit waits in a queue, cheapest first,
+# and is rejected if it is still waiting after COMPUTE_QUEUE_TIMEOUT.
+# A budget of None is unlimited.
+class Admission:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.waiting: list[tuple[int, int, Ticket]] = []
+        self.counter = itertools.count()
+        self.running = 0
+        self.flops = 0
+        self.bytes = 0
+
+    def check_upload(self, size: int):
+        limit = settings.COMPUTE_MAX_UPLOAD_BYTES
+        if limit is not None and size > limit:
+            raise AdmissionError(f"request body is {size} bytes, the limit is {limit}", 413)
+
+    def check_request(self, est: Estimate):
+        limit = settings.COMPUTE_MAX_REQUEST_FLOPS
+        if limit is not None and est.flops > limit:
+            raise AdmissionError(f"graph needs ~{est.flops:.3g} flops, the limit is {limit:.3g}", 413)
+        limit = settings.COMPUTE_MAX_REQUEST_BYTES
+        if limit is not None and est.peak_bytes > limit:
+            raise AdmissionError(f"graph needs ~{est.peak_bytes} bytes, the limit is {limit}", 413)
+
+    def fits(self, est: Estimate) -> bool:
+        # an idle server takes anything that passed the per-request check
+        if self.running == 0: return True
+        limit = settings.COMPUTE_MAX_INFLIGHT_FLOPS
+        if limit is not None and self.flops + est.flops > limit: return False
+        limit = settings.COMPUTE_MAX_INFLIGHT_BYTES
+        if limit is not None and self.bytes + est.peak_bytes > limit: return False
+        return True
+
+    def head(self) -> Ticket | None:
+        while len(self.waiting) != 0 and self.waiting[0][2].cancelled:
+            heapq.heappop(self.waiting)
+        if len(self.waiting) == 0: return None
+        return self.waiting[0][2]
+
+    @contextmanager
+    def admit(self, est: Estimate):
+        self.check_request(est)
+        ticket = Ticket(est)
+        deadline = time.monotonic() + settings.COMPUTE_QUEUE_TIMEOUT
+
+        with self.cond:
+            heapq.heappush(self.waiting, (est.flops, next(self.counter), ticket))
+            while self.head() is not ticket or not self.fits(est):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    ticket.cancelled = True
+                    self.cond.notify_all()
+                    raise AdmissionError(f"server busy: waited {settings.COMPUTE_QUEUE_TIMEOUT}s in the queue")
+                self.cond.wait(left)
+
+            heapq.heappop(self.waiting)
+            self.running += 1
+            self.flops += est.flops
+            self.bytes += est.peak_bytes
+            logger.info("admitted: %s, running=%d, waiting=%d", est, self.running, len(self.waiting))
+            self.cond.notify_all()
+
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.running -= 1
+                self.flops -= est.flops
+                self.bytes -= est.peak_bytes
+                self.cond.notify_all()
+
+
+instance = Admission()
+
+def admission() -> Admission:
+    return instance
@@ -0,0 +1,123 @@
+from __future__ import annotations
+from typing import Dict
+import glob
+import json
+import os
+import logging
+import torch
+import torch.utils.data
+from PIL import Image
+from torchvision.transforms import functional as TF
+
+from main.context import context
+from main.generators import Generator
+from main.graph import Graph, Node
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+# A graph saved by the client (static/graphs/*.json), cut down to the nodes the server
+# can run (net_node). const and noise nodes become generated inputs, every other net_node
+# input that is not fed by another net_node is a free input, fed with images when evaluating.
+class SavedGraph:
+    def __init__(self, json_obj: Dict):
+        ctx = context()
+        self.graph = Graph()
+        self.mapping: Dict[int, Node] = {}
+        self.inputs: list[tuple[Node, str]] = []
+
+        generators: Dict[int, Generator] = {}
+        for i, node_json in enumerate(json_obj["nodes"]):
+            instance = node_json["instance"]
+            if instance["kind"] == "const":
+                generators[i] = Generator({"kind": "const", "value": instance["value"], "dims": instance["dims"]})
+            elif instance["kind"] == "noise":
+                generators[i] = Generator({"kind": "uniform", "dims": instance["dims"], "seed": i})
+            if instance["kind"] != "net_node": continue
+            self.mapping[i] = self.graph.add_node(instance["endpoint"], instance.get("params", {}))
+
+        connected = set()
+        self.consumed = set()
+        for edge_json in json_obj["edges"]:
+            src, tgt = edge_json["in_port"], edge_json["out_port"]
+            if src["node"] in generators and tgt["node"] in self.mapping:
+                self.graph.add_generator(generators[src["node"]], self.mapping[tgt["node"]], tgt["channel"])
+                connected.add((self.mapping[tgt["node"]].index, tgt["channel"]))
+                continue
+            if src["node"] not in self.mapping or tgt["node"] not in self.mapping: continue
+            a, b = self.mapping[src["node"]], self.mapping[tgt["node"]]
+            self.graph.connect(a, src["channel"], b, tgt["channel"])
+            connected.add((b.index, tgt["channel"]))
+            self.consumed.add((a.index, src["channel"]))
+
+        for node in self.graph.nodes:
+            for ch in ctx.get_node(node.name).io(node.params)["ins"]:
+                if (node.index, ch) not in connected: self.inputs.append((node, ch))
+
+    @staticmethod
+    def load(path: str) -> SavedGraph:
+        with open(path) as f:
+            return SavedGraph(json.load(f))
+
+    def feed(self, x: torch.Tensor):
+        for node, ch in self.inputs:
+            edge = node.inputs.get(ch)
+            if edge is None: self.graph.add_input(x, node, ch)
+            else: edge.tensor = x
+
+    def find_output(self, name: str) -> tuple[Node, str]:
+        # "<saved node index>:<channel>" or "<endpoint>:<channel>"
+        node_name, ch = name.rsplit(":", 1)
+        if node_name.isdigit():
+            if int(node_name) not in self.mapping: raise Exception(f"saved node {node_name} is not a net_node")
+            return self.mapping[int(node_name)], ch
+        for node in self.graph.nodes:
+            if node.name == node_name: return node, ch
+        raise Exception(f"no node '{node_name}' in the graph")
+
+    def default_outputs(self) -> list[tuple[Node, str]]:
+        # outputs that no other net_node reads
+        res = []
+        for node in self.graph.nodes:
+            for ch in context().get_node(node.name).io(node.params)["outs"]:
+                if (node.index, ch) not in self.consumed: res.append((node, ch))
+        return res
+
+
+def list_images(patterns: list[str]) -> list[str]:
+    res = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                res += [os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTS)]
+        else:
+            res += [f for f in glob.glob(pattern, recursive=True) if f.lower().endswith(IMAGE_EXTS)]
+    return sorted(res)
+
+
+# Decodes images into CHW float tensors in [0, 1], the same layout the img_src node sends.
+# Images are resized to one size so that they can be batched.
+class ImageFiles(torch.utils.data.Dataset):
+    def __init__(self, paths: list[str], size: tuple[int, int]):
+        self.paths = paths
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, i: int) -> torch.Tensor:
+        with Image.open(self.paths[i]) as img:
+            img = img.convert("RGB").resize((self.size[1], self.size[0]), Image.Resampling.BILINEAR)
+            return TF.pil_to_tensor(img).to(torch.float32) / 255
+
+
+def image_loader(paths: list[str], size: tuple[int, int], batch_size: int, workers: int, prefetch: int) -> torch.utils.data.DataLoader:
+    # decoding runs in `workers` processes, each keeping `prefetch` batches ready
+    return torch.utils.data.DataLoader(
+        ImageFiles(paths, size),
+        batch_size=batch_size,
+        num_workers=workers,
+        prefetch_factor=prefetch if workers > 0 else None,
+        persistent_workers=False,
+    )
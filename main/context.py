@@ -7,7 +7,12 @@ from typing import Dict
 from urllib.parse import urlencode
 import logging
 from main.graph import Graph, Pinout
+from main.workers import WorkerPool, start_pool
+from main.threads import ThreadBudget, available_cores
+from main.spatial import Range, Rect, Window, changed_rect, compute_tiled, out_shape, tile_bytes, window
+from main.incremental import NOTHING, ActivationCache, Activations, Dirty, graph_key
 import sys
+import threading
 import torch
 import math
 
@@ -32,6 +37,32 @@ class NodeKind:
         _ = inputs
         raise Exception(f"TODO: implement Node.compute() for {self.name}")
 
+    # Output shapes for the given inputs. The inputs are meta tensors, so running
+    # compute() on them costs no memory and no time. Override if compute() can not.
+    def infer(self, params: Dict[str, str], inputs: Pinout) -> Pinout:
+        return self.compute(params, inputs)
+
+    def flops(self, params: Dict[str, str], inputs: Pinout, outputs: Pinout) -> int:
+        _ = params
+        _ = inputs
+        return sum([t.numel() for t in outputs.pinout.values()])
+
+    # Temporary memory compute() needs on top of its inputs and outputs, if known.
+    def scratch_bytes(self, params: Dict[str, str], inputs: Pinout) -> int:
+        _ = params
+        _ = inputs
+        return 0
+
+    # Recompute only what depends on the dirty input regions, given the outputs of the
+    # previous compute with the same params and input shapes.
+    # Returns the new outputs and their dirty regions, or None to fall back to compute().
+    def update(self, params: Dict[str, str], inputs: Pinout, dirty: Dict[str, Rect], cached: Pinout) -> tuple[Pinout, Dict[str, Rect]] | None:
+        _ = params
+        _ = inputs
+        _ = dirty
+        _ = cached
+        return None
+
     def register(self, ctx: Context):
         ctx.register(self)
 
@@ -41,6 +72,10 @@ class Model:
         self.model.eval()
         self.name = name
 
+        # every node's output is sent back (and cached), so a layer must not overwrite its input
+        for sub in self.model.modules():
+            if hasattr(sub, "inplace"): sub.inplace = False
+
         self.node_names: list[str] = []
         for (name, sub) in self.model.named_modules():
             if sum([1 for _ in sub.named_modules()]) != 1: continue
@@ -76,17 +111,101 @@ class Model:
     def list_node_names(self) -> list[str]:
         return self.node_names
 
+    def build_graph(self, x: torch.Tensor) -> Graph:
+        # same chain as generate_graph_json, with x fed into the first node
+        graph = Graph()
+        prev = None
+        for name in self.list_node_names():
+            node = graph.add_node(name, {})
+            if prev is None: graph.add_input(x, node, "o")
+            else: graph.connect(prev, "o", node, "o")
+            prev = node
+        return graph
+
+    def tiled(self, sub: torch.nn.Module | None, x: torch.Size) -> Window | None:
+        # spatially local layers on inputs larger than a tile run tile by tile
+        tile = settings.COMPUTE_TILE_SIZE
+        win = window(sub)
+        if tile <= 0 or win is None or len(x) < 3: return None
+        if win.out_size(0, x[-2]) <= tile and win.out_size(1, x[-1]) <= tile: return None
+        return win
+
     def compute(self, node_name: str, pinin: Pinout) -> Pinout:
         with torch.no_grad():
             sub = self.model.get_submodule(node_name.removeprefix(self.prefix()))
             x = pinin.get("o")
             assert x is not None
-            res = sub(x)
+            win = self.tiled(sub, x.shape)
+            if win is not None:
+                res = torch.empty(out_shape(sub, win, x), dtype=x.dtype)
+                peak = compute_tiled(sub, win, x, Rect.full(res), res, settings.COMPUTE_TILE_SIZE)
+                logger.debug("%s: tiled %s -> %s, peak temporaries %d bytes", node_name, list(x.shape), list(res.shape), peak)
+            else:
+                res = sub(x)
             assert isinstance(res, torch.Tensor)
             out = Pinout()
             out.set("o", res)
             return out
 
+    def infer(self, node_name: str, pinin: Pinout) -> Pinout:
+        sub = self.submodule(node_name)
+        if sub is None: return self.compute(node_name, pinin)
+
+        # the weights live on the cpu, swap in meta copies so they match the meta inputs
+        x = pinin.get("o")
+        assert x is not None
+        state = {k: torch.empty_like(v, device="meta") for k, v in sub.state_dict(keep_vars=True).items()}
+        with torch.no_grad():
+            res = torch.func.functional_call(sub, state, (x,))
+        assert isinstance(res, torch.Tensor)
+        out = Pinout()
+        out.set("o", res)
+        return out
+
+    def update(self, node_name: str, pinin: Pinout, dirty: Rect, cached: torch.Tensor) -> tuple[torch.Tensor, Rect] | None:
+        sub = self.submodule(node_name)
+        win = window(sub)
+        x = pinin.get("o")
+        if sub is None or win is None or x is None: return None
+
+        rect = win.out_rect(dirty, cached.shape)
+        if rect.empty(): return cached, rect
+        tile = settings.COMPUTE_TILE_SIZE
+        if tile <= 0: tile = max(rect.rows.size(), rect.cols.size())
+        y = cached.clone()
+        with torch.no_grad():
+            compute_tiled(sub, win, x, rect, y, tile)
+        return y, rect
+
+    def submodule(self, node_name: str) -> torch.nn.Module | None:
+        try:
+            return self.model.get_submodule(node_name.removeprefix(self.prefix()))
+        except AttributeError:
+            return None
+
+    def flops(self, node_name: str, pinin: Pinout, pinout: Pinout) -> int:
+        y = pinout.get("o")
+        assert y is not None
+        sub = self.submodule(node_name)
+        if isinstance(sub, torch.nn.Conv2d):
+            kh, kw = sub.kernel_size
+            return 2 * y.numel() * (sub.in_channels // sub.groups) * kh * kw
+        elif isinstance(sub, torch.nn.Linear):
+            return 2 * y.numel() * sub.in_features
+        elif isinstance(sub, (torch.nn.MaxPool2d, torch.nn.AvgPool2d, torch.nn.AdaptiveAvgPool2d)):
+            x = pinin.get("o")
+            assert x is not None
+            return max(x.numel(), y.numel())
+        return y.numel()
+
+    def scratch_bytes(self, node_name: str, pinin: Pinout) -> int:
+        x = pinin.get("o")
+        assert x is not None
+        sub = self.submodule(node_name)
+        win = self.tiled(sub, x.shape)
+        if sub is None or win is None: return 0
+        return tile_bytes(sub, win, x.shape, settings.COMPUTE_TILE_SIZE)
+
     def contents(self, node_name: str) -> str:
         sub = self.model.get_submodule(node_name.removeprefix(self.prefix()))
         return f"<p>{node_name}</p> <p>{sub._get_name()}</p>"
@@ -107,6 +226,7 @@ class Model:
             except Exception as e: 
                 logger.error("could not generate graph %s: %s", graph_dir, str(e))
 
+        ctx.register_model(self)
         for node_name in self.list_node_names():
             node = ModelNode(self, node_name)
             node.register(ctx)
@@ -128,10 +248,38 @@ class ModelNode(NodeKind):
         _ = params
         return self.parent.io(self.get_name())
 
+    def infer(self, params: Dict[str, str], inputs: Pinout) -> Pinout:
+        _ = params
+        return self.parent.infer(self.get_name(), inputs)
+
+    def flops(self, params: Dict[str, str], inputs: Pinout, outputs: Pinout) -> int:
+        _ = params
+        return self.parent.flops(self.get_name(), inputs, outputs)
+
+    def scratch_bytes(self, params: Dict[str, str], inputs: Pinout) -> int:
+        _ = params
+        return self.parent.scratch_bytes(self.get_name(), inputs)
+
+    def update(self, params: Dict[str, str], inputs: Pinout, dirty: Dict[str, Rect], cached: Pinout) -> tuple[Pinout, Dict[str, Rect]] | None:
+        _ = params
+        y = cached.get("o")
+        if "o" not in dirty or y is None: return None
+        res = self.parent.update(self.get_name(), inputs, dirty["o"], y)
+        if res is None: return None
+
+        out = Pinout()
+        out.set("o", res[0])
+        return out, {"o": res[1]}
+
 
 class Context:
     def __init__(self):
         self.nodes: Dict[str, NodeKind] = {}
+        self.models: Dict[str, Model] = {}
+        self.pool: WorkerPool | None = None
+        self.pool_lock = threading.Lock()
+        self.budget = ThreadBudget(available_cores(), settings.COMPUTE_THREAD_BUDGET)
+        self.activations = ActivationCache(settings.COMPUTE_INCREMENTAL_CACHE, settings.COMPUTE_INCREMENTAL_CACHE_BYTES)
 
     def register(self, node: NodeKind):
         logger.info("Registered node: '%s'", node.get_name())
@@ -140,11 +288,96 @@ class Context:
     def get_node(self, name: str) -> NodeKind:
         return self.nodes[name]
 
-    def compute(self, graph: Graph):
-        for n in graph.order():
-            node = self.get_node(n.name)
-            pinout = node.compute(n.params, n.get_pinin())
-            n.set_pinout(pinout)
+    def register_model(self, model: Model):
+        logger.info("Registered model: '%s'", model.get_name())
+        self.models[model.get_name()] = model
+
+    def get_model(self, name: str) -> Model:
+        return self.models[name]
+
+    def get_pool(self) -> WorkerPool | None:
+        if settings.COMPUTE_WORKERS <= 0: return None
+
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = start_pool(
+                    settings.COMPUTE_WORKERS,
+                    settings.COMPUTE_WORKER_TIMEOUT,
+                    settings.COMPUTE_WORKER_STARTUP_TIMEOUT,
+                    settings.COMPUTE_WORKER_CHECK_INTERVAL,
+                )
+            return self.pool
+
+    def compute(self, graph: Graph, session: str | None = None):
+        pool = self.get_pool()
+        if pool is not None: pool.compute(graph, session)
+        else: self.compute_local(graph, session)
+
+    def compute_local(self, graph: Graph, session: str | None = None, incremental: bool = True):
+        # With the activation cache on, the previous compute of the same graph (for the same
+        # session) is diffed against: unchanged nodes are reused and spatially local layers
+        # only recompute the region their changed inputs can reach. No session, no cache.
+        key = graph_key(graph, session) if incremental and session is not None and self.activations.size > 0 else None
+        prev = self.activations.get(key) if key is not None else None
+        dirty: Dict[tuple[int, str], Dirty] = {}
+
+        with self.budget.request():
+            for n in graph.order():
+                self.budget.apply()
+                node = self.get_node(n.name)
+                pinin = n.get_pinin()
+
+                res = None
+                if prev is not None and n.index in prev.outputs:
+                    ins: Dict[str, Dirty] = {}
+                    for ch, e in n.inputs.items():
+                        if e.input is not None:
+                            ins[ch] = dirty.get((e.input.node.index, e.input.channel))
+                        elif e.generator is not None and prev.generators.get((n.index, ch)) == e.generator.params:
+                            # the same spec generates the same tensor, no need to compare them
+                            ins[ch] = NOTHING
+                        elif (n.index, ch) in prev.inputs:
+                            assert e.tensor is not None
+                            ins[ch] = changed_rect(prev.inputs[(n.index, ch)], e.tensor)
+                        else:
+                            ins[ch] = None
+                    res = self.update(node, n.params, pinin, ins, prev.outputs[n.index])
+
+                if res is None:
+                    pinout = node.compute(n.params, pinin)
+                    outs: Dict[str, Dirty] = {}
+                    for ch, t in pinout.pinout.items():
+                        # diffing is much cheaper than what follows, and keeps the nodes
+                        # after a non-local one (e.g. a resize) incremental
+                        old = prev.outputs[n.index].get(ch) if prev is not None and n.index in prev.outputs else None
+                        outs[ch] = changed_rect(old, t) if old is not None else None
+                else:
+                    pinout, outs = res
+
+                for ch, d in outs.items(): dirty[(n.index, ch)] = d
+                n.set_pinout(pinout)
+
+        if key is not None: self.activations.put(key, Activations(graph))
+
+    def update(self, node: NodeKind, params: Dict[str, str], pinin: Pinout, ins: Dict[str, Dirty], cached: Pinout) -> tuple[Pinout, Dict[str, Dirty]] | None:
+        # nodes without inputs may not be pure, so they always run
+        if len(ins) == 0: return None
+        dirty: Dict[str, Rect] = {}
+        for ch, d in ins.items():
+            if d is None: return None
+            dirty[ch] = d
+
+        if all([d.empty() for d in dirty.values()]):
+            return cached, {ch: NOTHING for ch in cached.pinout.keys()}
+
+        res = node.update(params, pinin, dirty, cached)
+        if res is not None and settings.COMPUTE_INCREMENTAL_VERIFY:
+            full = node.compute(params, pinin)
+            for ch, t in full.pinout.items():
+                got = res[0].get(ch)
+                if got is None or got.shape != t.shape or not torch.allclose(got, t, rtol=1e-4, atol=1e-5):
+                    raise Exception(f"incremental compute of {node.get_name()} differs from full compute on '{ch}'")
+        return res
 
 instance = Context()
 
@@ -0,0 +1,71 @@
+from __future__ import annotations
+from typing import Dict
+import json
+import logging
+import torch
+
+from main.context import context
+from main.graph import Graph
+from main.shapes import Shapes
+from main.message import align_next
+
+logger = logging.getLogger(__name__)
+
+def tensor_bytes(shape: torch.Size) -> int:
+    # everything travels as f32
+    return 4 * shape.numel()
+
+def block_bytes(shape: torch.Size) -> int:
+    # same layout as Response.encode: byte size, dim cnt, dims, data
+    return 4 + 4 + 4 * len(shape) + tensor_bytes(shape)
+
+
+class Estimate:
+    def __init__(self):
+        self.flops = 0
+        self.peak_bytes = 0
+        self.scratch_bytes = 0
+        self.response_bytes = 0
+        self.request_bytes = 0
+
+    def json(self) -> Dict:
+        return {
+            "flops": self.flops,
+            "peak_bytes": self.peak_bytes,
+            "scratch_bytes": self.scratch_bytes,
+            "response_bytes": self.response_bytes,
+            "request_bytes": self.request_bytes,
+        }
+
+    def __str__(self) -> str:
+        return json.dumps(self.json())
+
+
+def estimate(graph: Graph, shapes: Shapes, request_bytes: int = 0) -> Estimate:
+    # Every output is kept until the response is sent, so nothing is freed on the way
+    # and the peak is the sum of all inputs and outputs, plus the scratch space of a node.
+    ctx = context()
+    res = Estimate()
+    res.request_bytes = request_bytes
+
+    outputs = []
+    for node in graph.nodes:
+        for e in node.inputs.values():
+            if e.input is None:
+                if e.generator is not None: res.peak_bytes += e.generator.nbytes()
+                else: res.peak_bytes += tensor_bytes(e.shape())
+
+        kind = ctx.get_node(node.name)
+        pinin = shapes.pinin(node.index)
+        res.flops += kind.flops(node.params, pinin, shapes.pinout(node.index))
+        res.scratch_bytes = max(res.scratch_bytes, kind.scratch_bytes(node.params, pinin))
+
+        for ch, shape in shapes.outs[node.index].items():
+            res.peak_bytes += tensor_bytes(shape)
+            res.response_bytes += block_bytes(shape)
+            outputs.append({"node": node.index, "channel": ch, "shape": list(shape)})
+
+    res.response_bytes += align_next(16 + len(json.dumps(outputs).encode()), 4)
+    # nodes run one at a time, so only the largest scratch space is live at once
+    res.peak_bytes += res.scratch_bytes
+    return res
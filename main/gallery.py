@@ -0,0 +1,167 @@
+from __future__ import annotations
+from typing import Dict
+import json
+import os
+import logging
+import numpy as np
+from numpy.lib.format import open_memmap
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Rows scanned at once, bounds the temporaries of a search over a memory-mapped gallery.
+CHUNK = 1 << 16
+
+def pool(t: torch.Tensor) -> torch.Tensor:
+    # [..., C, H, W] -> [..., C] by averaging over space; vectors are kept as they are
+    if t.dim() >= 3: return t.mean(dim=(-2, -1))
+    return t
+
+
+# Pooled activations of a set of images at one layer, stored in a directory:
+#   meta.json     layer, count, dim, product quantizer parameters
+#   images.txt    image path of every row
+#   vectors.npy   [N, D] f32, memory-mapped
+#   norms.npy     [N] f32
+#   pq_centroids.npy, pq_codes.npy   optional, [M, K, D/M] f32 and [N, M] u8
+class Gallery:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta: Dict = json.load(f)
+        with open(os.path.join(path, "images.txt")) as f:
+            self.images = [line for line in f.read().split("\n") if line != ""]
+
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        self.centroids: np.ndarray | None = None
+        self.codes: np.ndarray | None = None
+        if "pq" in self.meta:
+            self.centroids = np.load(os.path.join(path, "pq_centroids.npy"))
+            self.codes = np.load(os.path.join(path, "pq_codes.npy"), mmap_mode="r")
+
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def search(self, q: np.ndarray, k: int, metric: str = "cos", quantized: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        # top k rows, most similar first: cosine similarity (higher is better) or
+        # squared L2 distance (lower is better)
+        if metric not in ("cos", "l2"): raise Exception(f"unknown metric '{metric}', expected cos or l2")
+        if k < 1: raise Exception(f"k must be at least 1, got {k}")
+        if q.shape != (self.dim(),): raise Exception(f"query has shape {list(q.shape)}, the gallery expects [{self.dim()}]")
+        q = q.astype(np.float32)
+        k = min(k, len(self))
+        if quantized and self.codes is None: raise Exception(f"gallery {self.name()} has no product quantizer")
+
+        if quantized:
+            assert self.centroids is not None
+            m, _, sub = self.centroids.shape
+            qs = q.reshape(m, 1, sub)
+            # asymmetric distance: one table lookup per subspace instead of touching the vectors
+            if metric == "cos": table = (self.centroids * qs).sum(-1)
+            else: table = ((self.centroids - qs) ** 2).sum(-1)
+
+        best_i = np.empty(0, dtype=np.int64)
+        best_s = np.empty(0, dtype=np.float32)
+        qn = float(np.linalg.norm(q)) or 1.0
+        for start in range(0, len(self), CHUNK):
+            end = min(start + CHUNK, len(self))
+            if quantized:
+                assert self.codes is not None
+                codes = np.asarray(self.codes[start:end])
+                s = table[np.arange(table.shape[0]), codes].sum(-1)
+            else:
+                v = np.asarray(self.vectors[start:end])
+                if metric == "cos": s = v @ q
+                else: s = ((v - q) ** 2).sum(-1)
+
+            if metric == "cos":
+                s = s / (np.maximum(np.asarray(self.norms[start:end]), 1e-12) * qn)
+            else:
+                s = -s
+
+            # keep the running top k; the scores are negated for l2 so that higher is better
+            idx = np.concatenate([best_i, np.arange(start, end)])
+            scores = np.concatenate([best_s, s.astype(np.float32)])
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                idx, scores = idx[top], scores[top]
+            best_i, best_s = idx, scores
+
+        order = np.argsort(-best_s, kind="stable")
+        best_i, best_s = best_i[order], best_s[order]
+        if metric == "l2": best_s = -best_s
+        return best_i, best_s
+
+
+class GalleryWriter:
+    def __init__(self, path: str, count: int, dim: int, layer: str, images: list[str]):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta = {"layer": layer, "count": count, "dim": dim}
+        self.vectors = open_memmap(os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dim))
+        self.norms = open_memmap(os.path.join(path, "norms.npy"), mode="w+", dtype=np.float32, shape=(count,))
+        with open(os.path.join(path, "images.txt"), "w") as f:
+            f.write("\n".join(images) + "\n")
+
+    def write(self, offset: int, v: np.ndarray):
+        self.vectors[offset:offset + v.shape[0]] = v
+        self.norms[offset:offset + v.shape[0]] = np.linalg.norm(v, axis=-1)
+
+    def train_pq(self, m: int, k: int = 256, iters: int = 20, sample: int = 1 << 16, seed: int = 0):
+        n, dim = self.vectors.shape
+        if dim % m != 0: raise Exception(f"dim {dim} is not divisible into {m} subspaces")
+        k = min(k, n, 256)
+        sub = dim // m
+        rng = np.random.default_rng(seed)
+        train = np.asarray(self.vectors[np.sort(rng.choice(n, min(n, sample), replace=False))])
+
+        centroids = np.empty((m, k, sub), dtype=np.float32)
+        for i in range(m):
+            centroids[i] = kmeans(train[:, i * sub:(i + 1) * sub], k, iters, rng)
+
+        codes = open_memmap(os.path.join(self.path, "pq_codes.npy"), mode="w+", dtype=np.uint8, shape=(n, m))
+        for start in range(0, n, CHUNK):
+            v = np.asarray(self.vectors[start:start + CHUNK])
+            for i in range(m):
+                codes[start:start + v.shape[0], i] = nearest(v[:, i * sub:(i + 1) * sub], centroids[i])
+        codes.flush()
+        np.save(os.path.join(self.path, "pq_centroids.npy"), centroids)
+        self.meta["pq"] = {"m": m, "k": k}
+
+    def close(self):
+        self.vectors.flush()
+        self.norms.flush()
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            f.write(json.dumps(self.meta))
+
+
+def nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, the |x|^2 term does not change the argmin
+    d = (centroids ** 2).sum(-1)[None, :] - 2 * x @ centroids.T
+    return d.argmin(-1)
+
+def kmeans(x: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    c = x[rng.choice(x.shape[0], k, replace=False)].copy()
+    for _ in range(iters):
+        assign = nearest(x, c)
+        for j in range(k):
+            members = x[assign == j]
+            # an empty cluster restarts from a random point
+            c[j] = members.mean(0) if len(members) != 0 else x[rng.integers(x.shape[0])]
+    return c
+
+
+def gallery_dirs(root: str) -> list[str]:
+    if not os.path.isdir(root): return []
+    res = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isfile(os.path.join(path, "meta.json")): res.append(path)
+    return res
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from typing import Dict
+import torch
+
+# Inputs described by a few parameters instead of uploaded data, e.g.
+#   {"kind": "const", "value": 0.8, "dims": [100, 100]}
+#   {"kind": "zeros", "dims": [3, 224, 224]}
+#   {"kind": "uniform", "dims": [100, 100], "seed": 1, "low": 0, "high": 1}
+#   {"kind": "normal", "dims": [100, 100], "seed": 1, "mean": 0, "std": 1}
+#   {"kind": "arange", "start": 0, "end": 10, "step": 1, ?"dims": [4, 10]}
+#   {"kind": "linspace", "start": 0, "end": 1, "steps": 5, ?"dims": [4, 5]}
+# const/zeros are a single value expanded to the full shape, and arange/linspace are
+# expanded over the leading dims, so they take no memory beyond one row.
+KINDS = ["const", "zeros", "uniform", "normal", "arange", "linspace"]
+
+
+class Generator:
+    def __init__(self, json_obj: Dict):
+        self.kind = json_obj["kind"]
+        if self.kind not in KINDS: raise Exception(f"unknown generator '{self.kind}', expected one of {KINDS}")
+        self.params = json_obj
+
+        dims = json_obj.get("dims")
+        row = self.row_size()
+        if dims is None:
+            if row is None: raise Exception(f"generator '{self.kind}' needs dims")
+            dims = [row]
+        self.dims = [int(x) for x in dims]
+        if any([x < 0 for x in self.dims]): raise Exception(f"negative dims {self.dims}")
+        if row is not None and (len(self.dims) == 0 or self.dims[-1] != row):
+            raise Exception(f"generator '{self.kind}' makes rows of {row}, dims {self.dims} do not end with it")
+
+    def number(self, key: str, default: float) -> float:
+        return float(self.params.get(key, default))
+
+    def row_size(self) -> int | None:
+        if self.kind == "arange":
+            start, end, step = self.number("start", 0), self.number("end", 0), self.number("step", 1)
+            if step == 0: raise Exception("arange step is 0")
+            return len(torch.arange(start, end, step, device="meta"))
+        elif self.kind == "linspace":
+            return int(self.params["steps"])
+        return None
+
+    def shape(self) -> torch.Size:
+        return torch.Size(self.dims)
+
+    def nbytes(self) -> int:
+        # memory of the materialized tensor
+        if self.kind in ("const", "zeros"): return 4
+        if self.kind in ("arange", "linspace"): return 4 * self.dims[-1]
+        return 4 * self.shape().numel()
+
+    def materialize(self) -> torch.Tensor:
+        if self.kind == "const":
+            return torch.tensor(self.number("value", 0), dtype=torch.float32).expand(self.dims)
+        elif self.kind == "zeros":
+            return torch.zeros((), dtype=torch.float32).expand(self.dims)
+        elif self.kind == "uniform":
+            low, high = self.number("low", 0), self.number("high", 1)
+            t = torch.rand(self.dims, generator=self.rng(), dtype=torch.float32)
+            return t * (high - low) + low if (low, high) != (0, 1) else t
+        elif self.kind == "normal":
+            t = torch.randn(self.dims, generator=self.rng(), dtype=torch.float32)
+            return t * self.number("std", 1) + self.number("mean", 0)
+        elif self.kind == "arange":
+            row = torch.arange(self.number("start", 0), self.number("end", 0), self.number("step", 1), dtype=torch.float32)
+            return row.expand(self.dims)
+        else:
+            row = torch.linspace(self.number("start", 0), self.number("end", 1), self.dims[-1], dtype=torch.float32)
+            return row.expand(self.dims)
+
+    def rng(self) -> torch.Generator:
+        g = torch.Generator()
+        g.manual_seed(int(self.params.get("seed", 0)))
+        return g
+
+    def __str__(self) -> str:
+        return f"{self.kind}{self.dims}"
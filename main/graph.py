@@ -3,6 +3,8 @@ from typing import Dict
 from urllib.parse import urlencode
 import torch
 
+from main.generators import Generator
+
 class Node:
     def __init__(self, name: str, params: Dict[str, str], index: int):
         self.name = name
@@ -15,6 +17,8 @@ class Node:
     def get_pinin(self) -> Pinout:
         res = Pinout()
         for ch, e in self.inputs.items():
+            # generated inputs are only materialized when a node needs them
+            if e.tensor is None and e.generator is not None: e.tensor = e.generator.materialize()
             assert e.tensor is not None
             res.set(ch, e.tensor)
         return res
@@ -51,6 +55,12 @@ class Edge:
         self.input = src 
         self.output = tgt
         self.tensor: None | torch.Tensor = None
+        self.generator: None | Generator = None
+
+    def shape(self) -> torch.Size:
+        if self.tensor is not None: return self.tensor.shape
+        assert self.generator is not None
+        return self.generator.shape()
 
 class Graph:
     def __init__(self):
@@ -76,6 +86,13 @@ class Graph:
         node.inputs[channel] = edge
         return edge
 
+    def add_generator(self, generator: Generator, node: Node, channel: str):
+        port = Port(node, channel, "in")
+        edge = Edge(None, port)
+        edge.generator = generator
+        node.inputs[channel] = edge
+        return edge
+
     def order(self) -> list[Node]:
         res = []
         visited = set()
@@ -115,8 +132,8 @@ class Graph:
 
             for ch, e in node.inputs.items():
                 if e.input is not None: continue
-                assert e.tensor is not None
-                res += "\n\t* --[" + ch + "]--> " + name + f" {e.tensor.shape}"
+                src = "*" if e.generator is None else str(e.generator)
+                res += "\n\t" + src + " --[" + ch + "]--> " + name + f" {e.shape()}"
 
         return res
 
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict
+import json
+import threading
+import torch
+
+from main.graph import Graph, Pinout
+from main.spatial import Range, Rect
+
+NOTHING = Rect(Range(0, 0), Range(0, 0))
+
+# Dirty region of a tensor since the previous compute of the same graph:
+# a Rect over its (H, W) positions, NOTHING if unchanged, None if anything may have changed.
+Dirty = Rect | None
+
+
+def graph_key(graph: Graph, session: str) -> str:
+    nodes = [[n.name, sorted(n.params.items())] for n in graph.nodes]
+    edges = []
+    for n in graph.nodes:
+        for ch, e in n.inputs.items():
+            if e.input is None: edges.append([None, None, n.index, ch])
+            else: edges.append([e.input.node.index, e.input.channel, n.index, ch])
+    return json.dumps([session, nodes, sorted(edges, key=str)])
+
+
+class Activations:
+    def __init__(self, graph: Graph):
+        self.inputs: Dict[tuple[int, str], torch.Tensor] = {}
+        self.outputs: Dict[int, Pinout] = {}
+        self.generators: Dict[tuple[int, str], Dict] = {}
+
+        for n in graph.nodes:
+            for ch, e in n.inputs.items():
+                if e.input is not None: continue
+                # a generated input is diffed by its spec, the tensor is not needed
+                if e.generator is not None: self.generators[(n.index, ch)] = e.generator.params
+                elif e.tensor is not None: self.inputs[(n.index, ch)] = e.tensor
+            self.outputs[n.index] = n.get_pinout()
+
+    def nbytes(self) -> int:
+        # memory actually held: an expanded view costs its storage, not its logical size,
+        # and tensors sharing a storage (views, a node passing its input through) count once
+        storages: Dict[int, int] = {}
+        tensors = list(self.inputs.values())
+        for pinout in self.outputs.values(): tensors += list(pinout.pinout.values())
+        for t in tensors:
+            storage = t.untyped_storage()
+            storages[storage.data_ptr()] = storage.nbytes()
+        return sum(storages.values())
+
+
+# Previous activations per (session, graph structure), least recently used is dropped first.
+# At most size graphs and max_bytes of tensors are kept, a graph larger than max_bytes is
+# not cached at all.
+class ActivationCache:
+    def __init__(self, size: int, max_bytes: int | None):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, tuple[Activations, int]] = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Activations | None:
+        with self.lock:
+            if key not in self.entries: return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key: str, value: Activations):
+        if self.size <= 0: return
+        size = value.nbytes()
+        with self.lock:
+            self.drop(key)
+            if self.max_bytes is not None and size > self.max_bytes: return
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while len(self.entries) > self.size or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self.drop(next(iter(self.entries)))
+
+    def drop(self, key: str):
+        if key not in self.entries: return
+        _, size = self.entries.pop(key)
+        self.bytes -= size
@@ -0,0 +1,60 @@
+import time
+import torch
+from django.core.management.base import BaseCommand
+
+from main.context import context
+from main.graph import Graph
+
+
+class Command(BaseCommand):
+    help = "Compare full and incremental compute latency after editing a small patch of the input"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default="vgg16")
+        parser.add_argument("--size", type=int, default=224, help="input image height/width")
+        parser.add_argument("--patch", type=int, nargs="+", default=[4, 16, 64], help="edited square sizes")
+        parser.add_argument("--repeats", type=int, default=3)
+
+    def handle(self, *args, **options):
+        ctx = context()
+        # the cache is off by default, the benchmark only needs the one graph it edits
+        ctx.activations.size = max(ctx.activations.size, 1)
+        ctx.activations.max_bytes = None
+
+        model = ctx.get_model(options["model"])
+        size = options["size"]
+        x = torch.rand((3, size, size))
+        ctx.compute_local(model.build_graph(x), "bench")
+
+        self.stdout.write(f"{'patch':>6} {'full ms':>9} {'incr ms':>9} {'speedup':>8} {'max diff':>10}")
+        for patch in options["patch"]:
+            full_t, incr_t, diff = 0.0, 0.0, 0.0
+            for i in range(options["repeats"]):
+                x = x.clone()
+                r, c = [int(v) for v in torch.randint(0, size - patch + 1, (2,))]
+                x[:, r:r + patch, c:c + patch] = torch.rand((3, patch, patch))
+
+                full = model.build_graph(x)
+                start = time.perf_counter()
+                # never touches the cache, which only keeps the "bench" graph
+                ctx.compute_local(full, incremental=False)
+                full_t += time.perf_counter() - start
+
+                incr = model.build_graph(x)
+                start = time.perf_counter()
+                ctx.compute_local(incr, "bench")
+                incr_t += time.perf_counter() - start
+
+                diff = max(diff, self.max_diff(full, incr))
+
+            n = options["repeats"]
+            self.stdout.write(f"{patch:>6} {full_t / n * 1000:>9.1f} {incr_t / n * 1000:>9.1f} {full_t / incr_t:>7.2f}x {diff:>10.2e}")
+
+    def max_diff(self, a: Graph, b: Graph) -> float:
+        res = 0.0
+        for na, nb in zip(a.nodes, b.nodes):
+            for ch, t in na.get_pinout().pinout.items():
+                u = nb.get_pinout().get(ch)
+                assert u is not None
+                res = max(res, (t - u).abs().max().item())
+        return res
@@ -0,0 +1,51 @@
+import threading
+import time
+import torch
+from django.core.management.base import BaseCommand
+
+from main.context import context
+
+
+class Command(BaseCommand):
+    help = "Measure aggregate images/sec of concurrent in-process computes, with and without the thread budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default="vgg16")
+        parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+        parser.add_argument("--requests", type=int, default=4, help="requests per client")
+        parser.add_argument("--size", type=int, default=224, help="input image height/width")
+
+    def handle(self, *args, **options):
+        ctx = context()
+        model = ctx.get_model(options["model"])
+        x = torch.rand((3, options["size"], options["size"]))
+        enabled = ctx.budget.enabled
+
+        # warm up, so the first measurement does not pay for lazy init
+        ctx.compute_local(model.build_graph(x))
+
+        try:
+            self.stdout.write(f"cores={ctx.budget.cores}")
+            self.stdout.write(f"{'clients':>8} {'naive img/s':>12} {'budget img/s':>13} {'speedup':>8}")
+            for clients in options["clients"]:
+                ctx.budget.enabled = False
+                naive = self.run(model, x, clients, options["requests"])
+                ctx.budget.enabled = True
+                budget = self.run(model, x, clients, options["requests"])
+                self.stdout.write(f"{clients:>8} {naive:>12.2f} {budget:>13.2f} {budget / naive:>7.2f}x")
+        finally:
+            ctx.budget.enabled = enabled
+
+    def run(self, model, x, clients: int, requests: int) -> float:
+        ctx = context()
+
+        def client():
+            for _ in range(requests):
+                ctx.compute_local(model.build_graph(x))
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for t in threads: t.start()
+        for t in threads: t.join()
+        elapsed = time.perf_counter() - start
+        return clients * requests / elapsed
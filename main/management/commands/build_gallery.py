@@ -0,0 +1,60 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.batch import SavedGraph, image_loader, list_images
+from main.context import context
+from main.gallery import GalleryWriter, pool
+
+
+class Command(BaseCommand):
+    help = "Run images through a saved graph and store the pooled activations of one output as a searchable gallery"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="gallery name, becomes the 'gallery:<name>' node")
+        parser.add_argument("graph", help="graph json, a path or a name in static/graphs")
+        parser.add_argument("images", nargs="+", help="image directories or glob patterns")
+        parser.add_argument("--output", required=True, help="'<node index>:<channel>' or '<endpoint>:<channel>'")
+        parser.add_argument("--pq", type=int, default=0, metavar="M", help="also train a product quantizer with M subspaces")
+        parser.add_argument("--size", type=int, nargs=2, default=[256, 256], metavar=("H", "W"))
+        parser.add_argument("--batch-size", type=int, default=16)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--prefetch", type=int, default=2)
+
+    def handle(self, *args, **options):
+        path = options["graph"]
+        if not os.path.exists(path): path = os.path.join(settings.BASE_DIR, "static/graphs", path)
+        saved = SavedGraph.load(path)
+        if len(saved.inputs) == 0: raise CommandError("the graph has no free input to feed the images into")
+        node, ch = saved.find_output(options["output"])
+
+        images = list_images(options["images"])
+        if len(images) == 0: raise CommandError("no images found")
+
+        loader = image_loader(images, tuple(options["size"]), options["batch_size"], options["workers"], options["prefetch"])
+        writer = None
+        offset = 0
+        start = time.perf_counter()
+        for batch in loader:
+            saved.feed(batch)
+            context().compute_local(saved.graph, incremental=False)
+            t = node.get_pinout().get(ch)
+            if t is None: raise CommandError(f"node {node.index} ({node.name}) has no output '{ch}'")
+
+            v = pool(t)
+            if v.dim() != 2: raise CommandError(f"output {list(t.shape)} does not pool into one vector per image")
+            if writer is None:
+                writer = GalleryWriter(os.path.join(settings.GALLERY_DIR, options["name"]), len(images), v.shape[1],
+                                       f"{node.name}:{ch}", images)
+            writer.write(offset, v.numpy())
+            offset += v.shape[0]
+            self.stdout.write(f"\r{offset}/{len(images)} images, {offset / (time.perf_counter() - start):.2f} img/s", ending="")
+        self.stdout.write("")
+
+        assert writer is not None
+        if options["pq"] > 0:
+            self.stdout.write(f"training product quantizer, {options['pq']} subspaces")
+            writer.train_pq(options["pq"])
+        writer.close()
+        self.stdout.write(f"gallery '{options['name']}': {offset} x {writer.meta['dim']} from {writer.meta['layer']}")
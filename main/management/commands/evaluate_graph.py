@@ -0,0 +1,83 @@
+import os
+import time
+import numpy as np
+from numpy.lib.format import open_memmap
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.batch import SavedGraph, image_loader, list_images
+from main.context import context
+
+
+class Command(BaseCommand):
+    help = "Evaluate a saved graph over a directory (or glob) of images, writing the selected outputs to .npy files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("graph", help="graph json, a path or a name in static/graphs")
+        parser.add_argument("images", nargs="+", help="image directories or glob patterns")
+        parser.add_argument("--out", required=True, help="directory for the .npy shards")
+        parser.add_argument("--output", action="append", default=[],
+                            help="'<node index>:<channel>' or '<endpoint>:<channel>', repeatable; defaults to the unconsumed outputs")
+        parser.add_argument("--size", type=int, nargs=2, default=[256, 256], metavar=("H", "W"), help="images are resized to this")
+        parser.add_argument("--batch-size", type=int, default=16)
+        parser.add_argument("--workers", type=int, default=4, help="image decoding processes")
+        parser.add_argument("--prefetch", type=int, default=2, help="batches each decoding process keeps ready")
+
+    def handle(self, *args, **options):
+        path = options["graph"]
+        if not os.path.exists(path): path = os.path.join(settings.BASE_DIR, "static/graphs", path)
+        saved = SavedGraph.load(path)
+        if len(saved.inputs) == 0: raise CommandError("the graph has no free input to feed the images into")
+
+        outputs = [saved.find_output(name) for name in options["output"]] or saved.default_outputs()
+        images = list_images(options["images"])
+        if len(images) == 0: raise CommandError("no images found")
+
+        os.makedirs(options["out"], exist_ok=True)
+        with open(os.path.join(options["out"], "images.txt"), "w") as f:
+            f.write("\n".join(images) + "\n")
+
+        loader = image_loader(images, tuple(options["size"]), options["batch_size"], options["workers"], options["prefetch"])
+        shards: dict = {}
+        offset = 0
+        wait_t, compute_t = 0.0, 0.0
+        start = time.perf_counter()
+        mark = start
+
+        for batch in loader:
+            now = time.perf_counter()
+            wait_t += now - mark
+
+            saved.feed(batch)
+            context().compute_local(saved.graph, incremental=False)
+            mark = time.perf_counter()
+            compute_t += mark - now
+
+            for node, ch in outputs:
+                t = node.get_pinout().get(ch)
+                if t is None: raise CommandError(f"node {node.index} ({node.name}) has no output '{ch}'")
+                # row i of every shard belongs to image i, so the batch must be the first dim
+                if t.dim() == 0 or t.shape[0] != batch.shape[0]:
+                    raise CommandError(f"output {node.index}:{ch} ({node.name}) has shape {list(t.shape)}, "
+                                       f"expected a first dim of {batch.shape[0]} (the batch)")
+                key = (node.index, ch)
+                if key not in shards:
+                    name = f"{node.index}_{node.name.replace(':', '_')}_{ch}.npy"
+                    shards[key] = open_memmap(os.path.join(options["out"], name), mode="w+", dtype=np.float32,
+                                              shape=(len(images),) + tuple(t.shape[1:]))
+                if tuple(t.shape[1:]) != shards[key].shape[1:]:
+                    raise CommandError(f"output {node.index}:{ch} ({node.name}) has shape {list(t.shape)}, "
+                                       f"earlier batches had {list(shards[key].shape[1:])} per image")
+                shards[key][offset:offset + t.shape[0]] = t.numpy()
+
+            offset += batch.shape[0]
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"\r{offset}/{len(images)} images, {offset / elapsed:.2f} img/s", ending="")
+
+        for shard in shards.values(): shard.flush()
+        elapsed = time.perf_counter() - start
+        self.stdout.write("")
+        self.stdout.write(f"{offset} images in {elapsed:.2f}s: {offset / elapsed:.2f} img/s "
+                          f"(waiting for images {wait_t:.2f}s, computing {compute_t:.2f}s)")
+        for (index, ch), shard in shards.items():
+            self.stdout.write(f"  {index}:{ch} -> {os.path.basename(shard.filename)} {list(shard.shape)}")
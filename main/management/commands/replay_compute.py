@@ -0,0 +1,110 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from django.core.management.base import BaseCommand, CommandError
+
+from main.traffic import Record, read_log
+
+
+def percentile(xs: list[float], p: float) -> float:
+    if len(xs) == 0: return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))]
+
+
+class Command(BaseCommand):
+    help = "Replay a recorded /compute traffic log against a server and report latency and throughput"
+    # the checks import the url conf, which loads every model; the replay only needs the log
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help="log written by main.middleware.RecordMiddleware")
+        parser.add_argument("--url", default="http://127.0.0.1:8000/", help="server root")
+        parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at most")
+        parser.add_argument("--speedup", type=float, default=1.0,
+                            help="divides the recorded gaps between requests, 0 sends as fast as possible")
+        parser.add_argument("--limit", type=int, default=None, help="replay only the first N requests")
+
+    def handle(self, *args, **options):
+        # records are written when their response completes, so overlapping requests are
+        # out of start order in the log
+        records: list[Record] = sorted(read_log(options["log"]), key=lambda rec: rec.time)
+        if options["limit"] is not None: records = records[:options["limit"]]
+        if len(records) == 0: raise CommandError("the log is empty")
+
+        root = options["url"].rstrip("/") + "/"
+        opener, token = self.csrf_session(root)
+
+        speedup = options["speedup"]
+        t0 = records[0].time
+        lock = threading.Lock()
+        latencies: list[float] = []
+        queued: list[float] = []
+        errors = 0
+        mismatches = 0
+        received = 0
+
+        def send(rec: Record, due: float):
+            nonlocal errors, mismatches, received
+            req = urllib.request.Request(root + "compute", data=rec.body, method="POST", headers={
+                "Content-Type": "application/octet-stream",
+                "X-CSRFToken": token,
+                "Referer": root,
+            })
+            sent = time.perf_counter()
+            try:
+                with opener.open(req) as resp:
+                    body = resp.read()
+                    status = resp.status
+            except urllib.error.HTTPError as e:
+                body = e.read()
+                status = e.code
+            except Exception as e:
+                self.stderr.write(f"request failed: {e}")
+                with lock: errors += 1
+                return
+            # measured from when the request was due, so waiting for a free slot (the
+            # server being too slow for the recorded rate) counts as latency
+            elapsed = time.perf_counter() - due
+
+            with lock:
+                latencies.append(elapsed)
+                queued.append(sent - due)
+                received += len(body)
+                if status != 200: errors += 1
+                if status != rec.status or (status == 200 and len(body) != rec.response_size): mismatches += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            for rec in records:
+                # wait here rather than in send, so a request that is not due yet does not
+                # hold a slot that one which is due could use
+                due = start + (rec.time - t0) / speedup if speedup > 0 else start
+                wait = due - time.perf_counter()
+                if wait > 0: time.sleep(wait)
+                pool.submit(send, rec, due)
+        elapsed = time.perf_counter() - start
+
+        recorded = [rec.duration for rec in records]
+        self.stdout.write(f"{len(records)} requests in {elapsed:.2f}s: {len(records) / elapsed:.2f} req/s, "
+                          f"{received / elapsed / 1e6:.2f} MB/s received, {errors} errors, "
+                          f"{mismatches} differ from the recorded status/response size")
+        self.stdout.write(f"{'':>10} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+        for name, xs in [("replayed", latencies), ("queued", queued), ("recorded", recorded)]:
+            row = " ".join([f"{percentile(xs, p) * 1000:>7.1f}ms" for p in (50, 90, 99, 100)])
+            self.stdout.write(f"{name:>10} {row}")
+
+    def csrf_session(self, root: str) -> tuple[urllib.request.OpenerDirector, str]:
+        # the index page sets the csrf cookie, /compute wants it echoed in X-CSRFToken
+        jar = CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+        try:
+            opener.open(root).read()
+        except Exception as e:
+            raise CommandError(f"could not reach {root}: {e}")
+        for cookie in jar:
+            if cookie.name == "csrftoken" and cookie.value is not None: return opener, cookie.value
+        raise CommandError(f"{root} did not set a csrf cookie")
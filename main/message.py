@@ -1,11 +1,13 @@
 import array
 import io
 import json
-import os
+import struct
+from typing import Dict
 import torch
 import logging
 
 from main.graph import Graph
+from main.generators import Generator
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +21,9 @@ class Request:
     def __init__(self):
         self.graph = Graph()
 
-    def decode(self, b: bytes):
+    # allow_shapes: edges may carry just a "shape" instead of a tensor block,
+    # they become meta tensors, which is enough for shape inference and cost estimates
+    def decode(self, b: bytes, allow_shapes: bool = False):
         reader = io.BytesIO(b)
         byte_size = int.from_bytes(reader.read(4), "little")
         assert int.from_bytes(reader.read(4), "little") == 0x69babe69
@@ -67,6 +71,12 @@ class Request:
 
             if "tensor" in edge_json:
                 _ = self.graph.add_input(tensors[edge_json["tensor"]], tgt_node, tgt_ch)
+            elif "shape" in edge_json:
+                if not allow_shapes: raise Exception("shape-only inputs can not be computed")
+                t = torch.empty([int(x) for x in edge_json["shape"]], device="meta")
+                _ = self.graph.add_input(t, tgt_node, tgt_ch)
+            elif "generator" in edge_json:
+                _ = self.graph.add_generator(Generator(edge_json["generator"]), tgt_node, tgt_ch)
             else:
                 src_node = self.graph.nodes[edge_json["in_port"]["node"]]
                 src_ch = edge_json["in_port"]["channel"]
@@ -86,42 +96,39 @@ class Response:
         if node not in self.outputs: self.outputs[node] = {}
         self.outputs[node][channel] = t
 
-    def encode(self) -> bytes:
-        writer = io.BytesIO()
-
-        json_obj = []
-        tensors: list[torch.Tensor] = []
+    def entries(self) -> list[tuple[Dict, torch.Tensor]]:
+        res = []
         for node in self.outputs.keys():
             outputs = self.outputs[node]
             for channel in outputs.keys():
-                json_obj.append({"node": node, "channel": channel})
-                tensors.append(outputs[channel])
-        
-        json_utf8 = json.dumps(json_obj).encode()
-
-        writer.write(int.to_bytes(0, 4, "little")) # byte_size to patch
-        writer.write(int.to_bytes(0xdeadbeef, 4, "little")) # magic
-        writer.write(int.to_bytes(len(tensors), 4, "little")) # block_cnt 
-        writer.write(int.to_bytes(len(json_utf8), 4, "little")) # json size
-
-        writer.write(json_utf8)
-        offset = writer.tell()
-        writer.seek(align_next(offset, 4) - offset, os.SEEK_CUR)
+                t = outputs[channel]
+                res.append(({"node": node, "channel": channel, "shape": list(t.shape)}, t))
+        return res
 
-        for t in tensors:
-            dims = array.array("I")
-            dims.fromlist(list(t.shape))
-            data = array.array("f")
-            data.frombytes(t.numpy().tobytes())
-            block_size = 4 + 4 + len(dims) * 4 + len(data) * 4
-
-            writer.write(int.to_bytes(block_size, 4, "little"))
-            writer.write(int.to_bytes(len(dims), 4, "little"))
-            writer.write(dims.tobytes())
-            writer.write(data.tobytes())
-
-        byte_size = writer.tell()
-        writer.seek(0)
-        writer.write(int.to_bytes(byte_size, 4, "little"))
-
-        return writer.getbuffer().tobytes()
+    def encode(self) -> bytes:
+        entries = self.entries()
+        json_utf8 = json.dumps([obj for obj, _ in entries]).encode()
+        header_size = align_next(16 + len(json_utf8), 4)
+
+        # the sizes are known up front, so the whole response is one allocation
+        # and the tensors are written straight into it
+        byte_size = header_size
+        for _, t in entries: byte_size += 4 + 4 + 4 * t.dim() + 4 * t.numel()
+        buf = bytearray(byte_size)
+        view = memoryview(buf)
+
+        struct.pack_into("<IIII", buf, 0, byte_size, 0xdeadbeef, len(entries), len(json_utf8))
+        view[16:16 + len(json_utf8)] = json_utf8
+
+        offset = header_size
+        for _, t in entries:
+            dims = list(t.shape)
+            block_size = 4 + 4 + 4 * len(dims) + 4 * t.numel()
+            struct.pack_into(f"<II{len(dims)}I", buf, offset, block_size, len(dims), *dims)
+            data_offset = offset + 8 + 4 * len(dims)
+            data = t.detach().to(torch.float32).contiguous().numpy()
+            view[data_offset:offset + block_size] = memoryview(data).cast("B")
+            offset += block_size
+
+        assert offset == byte_size
+        return bytes(buf)
@@ -0,0 +1,53 @@
+import random
+import time
+import logging
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, RequestDataTooBig
+from django.urls import Resolver404, resolve
+
+from main.traffic import Record, TrafficWriter
+
+logger = logging.getLogger(__name__)
+
+# Records sampled /compute request bodies, with their timing and response size, for
+# manage.py replay_compute. Off unless COMPUTE_RECORD_LOG is set.
+class RecordMiddleware:
+    def __init__(self, get_response):
+        if settings.COMPUTE_RECORD_LOG is None: raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.writer = TrafficWriter(str(settings.COMPUTE_RECORD_LOG), settings.COMPUTE_RECORD_MAX_BYTES)
+        self.full = False
+        logger.info("recording /compute traffic to %s", settings.COMPUTE_RECORD_LOG)
+
+    def __call__(self, request):
+        if request.method != "POST" or self.full or not self.is_compute(request.path_info):
+            return self.get_response(request)
+        if random.random() >= settings.COMPUTE_RECORD_SAMPLE:
+            return self.get_response(request)
+
+        # the size is checked before the body is read, oversized uploads are not recorded
+        limit = settings.COMPUTE_RECORD_MAX_BODY
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if limit is not None and length > limit: return self.get_response(request)
+        try:
+            body = request.body
+        except RequestDataTooBig:
+            return self.get_response(request)
+
+        start = time.time()
+        t = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - t
+
+        if limit is None or len(body) <= limit:
+            size = len(response.content) if not response.streaming else 0
+            if not self.writer.append(Record(start, duration, response.status_code, size, body)):
+                logger.warning("traffic log %s is full, recording stopped", settings.COMPUTE_RECORD_LOG)
+                self.full = True
+        return response
+
+    def is_compute(self, path: str) -> bool:
+        try:
+            return resolve(path).url_name == "compute"
+        except Resolver404:
+            return False
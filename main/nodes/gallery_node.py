@@ -0,0 +1,69 @@
+from typing import Dict, Tuple
+
+import torch
+from django.conf import settings
+from main.context import NodeKind
+from main.gallery import Gallery, gallery_dirs, pool
+from main.graph import Pinout
+
+# Top-k most similar gallery images for an activation of the layer the gallery was built from.
+# Outputs: "i" the row indices (see gallery_image/<name>/<i>), "s" their scores.
+class GalleryNode(NodeKind):
+    def __init__(self, gallery: Gallery):
+        super().__init__("gallery:" + gallery.name())
+        self.gallery = gallery
+
+    def decode_params(self, params: Dict[str, str]) -> Tuple[int, str, bool]:
+        k = 5
+        if "k" in params: k = int(params["k"])
+        if k < 1: raise Exception(f"k must be at least 1, got {k}")
+        metric = "cos"
+        if "metric" in params: metric = params["metric"]
+        if metric not in ("cos", "l2"): raise Exception(f"unknown metric '{metric}', expected cos or l2")
+        pq = False
+        if "pq" in params: pq = params["pq"] not in ("", "0", "false")
+        return min(k, len(self.gallery)), metric, pq
+
+    def contents(self, params: Dict[str, str]) -> str:
+        k, metric, pq = self.decode_params(params)
+        meta = self.gallery.meta
+        return f"<p>{self.name}</p> <p>{meta['layer']}: {meta['count']} images</p> <p>top {k}, {metric}{', pq' if pq else ''}</p>"
+
+    def io(self, params: Dict[str, str]) -> Dict:
+        _ = params
+        return {"ins": ["o"], "outs": ["i", "s"]}
+
+    def compute(self, params: Dict[str, str], inputs: Pinout) -> Pinout:
+        k, metric, pq = self.decode_params(params)
+        x = inputs.get("o")
+        if x is None: raise Exception("missing input: o")
+
+        q = pool(x.to(torch.float32))
+        idx, scores = self.gallery.search(q.numpy(), k, metric, pq)
+        res = Pinout()
+        res.set("i", torch.from_numpy(idx).to(torch.float32))
+        res.set("s", torch.from_numpy(scores))
+        return res
+
+    def infer(self, params: Dict[str, str], inputs: Pinout) -> Pinout:
+        k, _, _ = self.decode_params(params)
+        x = inputs.get("o")
+        if x is None: raise Exception("missing input: o")
+        q = pool(x)
+        if list(q.shape) != [self.gallery.dim()]:
+            raise Exception(f"pooled input has shape {list(q.shape)}, the gallery expects [{self.gallery.dim()}]")
+        res = Pinout()
+        res.set("i", torch.empty([k], device="meta"))
+        res.set("s", torch.empty([k], device="meta"))
+        return res
+
+    def flops(self, params: Dict[str, str], inputs: Pinout, outputs: Pinout) -> int:
+        _ = outputs
+        x = inputs.get("o")
+        assert x is not None
+        _, _, pq = self.decode_params(params)
+        if pq and self.gallery.codes is not None: return x.numel() + len(self.gallery) * self.gallery.codes.shape[1]
+        return x.numel() + 2 * len(self.gallery) * self.gallery.dim()
+
+def instances():
+    return [GalleryNode(Gallery(path)) for path in gallery_dirs(settings.GALLERY_DIR)]
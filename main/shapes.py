@@ -0,0 +1,79 @@
+from __future__ import annotations
+from typing import Dict
+import logging
+import torch
+
+from main.context import context
+from main.graph import Graph, Pinout
+
+logger = logging.getLogger(__name__)
+
+class ShapeError(Exception):
+    pass
+
+
+class Shapes:
+    def __init__(self):
+        self.ins: Dict[int, Dict[str, torch.Size]] = {}
+        self.outs: Dict[int, Dict[str, torch.Size]] = {}
+
+    def pinin(self, node: int) -> Pinout:
+        return meta_pinout(self.ins[node])
+
+    def pinout(self, node: int) -> Pinout:
+        return meta_pinout(self.outs[node])
+
+    def json(self) -> list[Dict]:
+        res = []
+        for node, outs in self.outs.items():
+            for ch, shape in outs.items():
+                res.append({"node": node, "channel": ch, "shape": list(shape)})
+        return res
+
+
+def meta_pinout(shapes: Dict[str, torch.Size]) -> Pinout:
+    res = Pinout()
+    for ch, shape in shapes.items():
+        res.set(ch, torch.empty(shape, device="meta"))
+    return res
+
+
+def infer_shapes(graph: Graph) -> Shapes:
+    # Runs every node on meta tensors (NodeKind.infer), which carry shapes but no data,
+    # so a graph that would fail halfway through compute is rejected before anything runs.
+    ctx = context()
+    res = Shapes()
+
+    for node in graph.order():
+        where = f"node {node.index} ({node.name})"
+        if node.name not in ctx.nodes: raise ShapeError(f"{where}: unknown node")
+        kind = ctx.get_node(node.name)
+
+        ins: Dict[str, torch.Size] = {}
+        for ch, e in node.inputs.items():
+            if e.input is None:
+                ins[ch] = e.shape()
+            else:
+                src = e.input.node.index
+                if src not in res.outs or e.input.channel not in res.outs[src]:
+                    raise ShapeError(f"{where}: input '{ch}' is not produced by node {src}")
+                ins[ch] = res.outs[src][e.input.channel]
+
+        try:
+            expected = kind.io(node.params)["ins"]
+        except Exception:
+            expected = []
+        for ch in expected:
+            if ch not in ins: raise ShapeError(f"{where}: missing input '{ch}'")
+
+        try:
+            with torch.no_grad():
+                pinout = kind.infer(node.params, meta_pinout(ins))
+        except Exception as e:
+            shapes = ", ".join([f"{ch}={list(s)}" for ch, s in ins.items()])
+            raise ShapeError(f"{where}: invalid inputs ({shapes}): {e}")
+
+        res.ins[node.index] = ins
+        res.outs[node.index] = {ch: t.shape for ch, t in pinout.pinout.items()}
+
+    return res
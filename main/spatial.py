@@ -0,0 +1,179 @@
+from __future__ import annotations
+import math
+import torch
+import torch.nn.functional as F
+
+# Helpers for spatially local layers (Conv2d, MaxPool2d, ReLU): which outputs depend on
+# which inputs, and how to compute only a rectangle of the output.
+# The last two dims of a tensor are always (H, W).
+
+class Range:
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+
+    def empty(self) -> bool:
+        return self.end <= self.start
+
+    def size(self) -> int:
+        return max(0, self.end - self.start)
+
+    def union(self, other: Range) -> Range:
+        if self.empty(): return other
+        if other.empty(): return self
+        return Range(min(self.start, other.start), max(self.end, other.end))
+
+    def __str__(self) -> str:
+        return f"{self.start}:{self.end}"
+
+
+class Rect:
+    def __init__(self, rows: Range, cols: Range):
+        self.rows = rows
+        self.cols = cols
+
+    def empty(self) -> bool:
+        return self.rows.empty() or self.cols.empty()
+
+    def union(self, other: Rect) -> Rect:
+        if self.empty(): return other
+        if other.empty(): return self
+        return Rect(self.rows.union(other.rows), self.cols.union(other.cols))
+
+    def area(self) -> int:
+        return self.rows.size() * self.cols.size()
+
+    def __str__(self) -> str:
+        return f"[{self.rows}, {self.cols}]"
+
+    @staticmethod
+    def full(t: torch.Tensor) -> Rect:
+        return Rect(Range(0, t.shape[-2]), Range(0, t.shape[-1]))
+
+
+class Window:
+    def __init__(self, kernel, stride, padding, dilation, pad_value: float):
+        self.kernel = kernel
+        self.stride = stride
+        self.padding = padding
+        self.dilation = dilation
+        self.pad_value = pad_value
+
+    def extent(self, dim: int) -> int:
+        return self.dilation[dim] * (self.kernel[dim] - 1) + 1
+
+    def out_range(self, dim: int, r: Range, out_size: int) -> Range:
+        # outputs that read at least one input in r
+        k, s, p = self.extent(dim), self.stride[dim], self.padding[dim]
+        start = max(0, math.ceil((r.start + p - k + 1) / s))
+        end = min(out_size, (r.end - 1 + p) // s + 1)
+        return Range(start, end)
+
+    def in_range(self, dim: int, r: Range) -> Range:
+        # inputs read by the outputs in r, may stick out of the tensor (into the padding)
+        k, s, p = self.extent(dim), self.stride[dim], self.padding[dim]
+        return Range(r.start * s - p, (r.end - 1) * s - p + k)
+
+    def out_size(self, dim: int, n: int) -> int:
+        return (n + 2 * self.padding[dim] - self.extent(dim)) // self.stride[dim] + 1
+
+    def out_rect(self, rect: Rect, out: torch.Size) -> Rect:
+        return Rect(self.out_range(0, rect.rows, out[-2]), self.out_range(1, rect.cols, out[-1]))
+
+    def in_rect(self, rect: Rect) -> Rect:
+        return Rect(self.in_range(0, rect.rows), self.in_range(1, rect.cols))
+
+
+def pair(x) -> tuple[int, int]:
+    if isinstance(x, (tuple, list)): return (int(x[0]), int(x[1]))
+    return (int(x), int(x))
+
+def window(sub: torch.nn.Module | None) -> Window | None:
+    if isinstance(sub, torch.nn.Conv2d):
+        if isinstance(sub.padding, str) or sub.padding_mode != "zeros": return None
+        return Window(pair(sub.kernel_size), pair(sub.stride), pair(sub.padding), pair(sub.dilation), 0.0)
+    elif isinstance(sub, torch.nn.MaxPool2d):
+        if sub.ceil_mode: return None
+        stride = sub.stride if sub.stride is not None else sub.kernel_size
+        return Window(pair(sub.kernel_size), pair(stride), pair(sub.padding), pair(sub.dilation), -math.inf)
+    elif isinstance(sub, torch.nn.ReLU):
+        return Window((1, 1), (1, 1), (0, 0), (1, 1), 0.0)
+    return None
+
+
+def crop(x: torch.Tensor, rect: Rect, pad_value: float) -> torch.Tensor:
+    # x[..., rect] where the parts outside of x are filled with pad_value
+    h, w = x.shape[-2], x.shape[-1]
+    r0, r1 = max(0, rect.rows.start), min(h, rect.rows.end)
+    c0, c1 = max(0, rect.cols.start), min(w, rect.cols.end)
+    res = x[..., r0:r1, c0:c1]
+    pads = (c0 - rect.cols.start, rect.cols.end - c1, r0 - rect.rows.start, rect.rows.end - r1)
+    if any([p != 0 for p in pads]): res = F.pad(res, pads, value=pad_value)
+    return res
+
+
+def compute_rect(sub: torch.nn.Module, win: Window, x: torch.Tensor, rect: Rect) -> torch.Tensor:
+    # the outputs of sub(x) inside rect, reading only the inputs they depend on
+    return apply_unpadded(sub, win, crop(x, win.in_rect(rect), win.pad_value))
+
+
+def apply_unpadded(sub: torch.nn.Module, win: Window, xs: torch.Tensor) -> torch.Tensor:
+    # sub(xs) for an input that already contains its padding
+    if isinstance(sub, torch.nn.Conv2d):
+        return F.conv2d(xs, sub.weight, sub.bias, win.stride, 0, win.dilation, sub.groups)
+    elif isinstance(sub, torch.nn.MaxPool2d):
+        return F.max_pool2d(xs, win.kernel, win.stride, 0, win.dilation)
+    elif isinstance(sub, torch.nn.ReLU):
+        return torch.relu(xs)
+    raise Exception(f"not a spatially local module: {sub._get_name()}")
+
+
+def out_shape(sub: torch.nn.Module, win: Window, x: torch.Tensor) -> list[int]:
+    h, w = win.out_size(0, x.shape[-2]), win.out_size(1, x.shape[-1])
+    if isinstance(sub, torch.nn.Conv2d): return list(x.shape[:-3]) + [sub.out_channels, h, w]
+    return list(x.shape[:-2]) + [h, w]
+
+
+def tiles(rect: Rect, tile: int) -> list[Rect]:
+    res = []
+    for r in range(rect.rows.start, rect.rows.end, tile):
+        for c in range(rect.cols.start, rect.cols.end, tile):
+            res.append(Rect(Range(r, min(r + tile, rect.rows.end)), Range(c, min(c + tile, rect.cols.end))))
+    return res
+
+
+def compute_tiled(sub: torch.nn.Module, win: Window, x: torch.Tensor, rect: Rect, out: torch.Tensor, tile: int) -> int:
+    # writes the outputs of sub(x) inside rect into out, one tile (plus the input halo it
+    # needs) at a time, so the temporaries never exceed one tile. Returns their peak bytes.
+    peak = 0
+    for t in tiles(rect, tile):
+        xs = crop(x, win.in_rect(t), win.pad_value)
+        patch = apply_unpadded(sub, win, xs)
+        peak = max(peak, xs.element_size() * xs.numel() + patch.element_size() * patch.numel())
+        out[..., t.rows.start:t.rows.end, t.cols.start:t.cols.end] = patch
+        del xs, patch
+    return peak
+
+
+def tile_bytes(sub: torch.nn.Module, win: Window, x: torch.Size, tile: int) -> int:
+    # upper bound of the temporaries compute_tiled allocates for one tile
+    rows = min(tile, win.out_size(0, x[-2]))
+    cols = min(tile, win.out_size(1, x[-1]))
+    in_rows = (rows - 1) * win.stride[0] + win.extent(0)
+    in_cols = (cols - 1) * win.stride[1] + win.extent(1)
+    lead = 1
+    for d in x[:-3]: lead *= d
+    cin = x[-3] if len(x) >= 3 else 1
+    cout = sub.out_channels if isinstance(sub, torch.nn.Conv2d) else cin
+    return 4 * lead * (cin * in_rows * in_cols + cout * rows * cols)
+
+
+def changed_rect(old: torch.Tensor, new: torch.Tensor) -> Rect | None:
+    # bounding box of the changed (H, W) positions, None if it can not be expressed as one
+    if old.shape != new.shape or new.dim() < 2: return None
+    diff = old != new
+    if diff.dim() > 2: diff = diff.flatten(0, -3).any(0)
+    rows = torch.nonzero(diff.any(1)).flatten()
+    cols = torch.nonzero(diff.any(0)).flatten()
+    if rows.numel() == 0: return Rect(Range(0, 0), Range(0, 0))
+    return Rect(Range(int(rows[0]), int(rows[-1]) + 1), Range(int(cols[0]), int(cols[-1]) + 1))
@@ -93,6 +93,14 @@ export class ConstNode extends graph.Node {
 		return ["o"];
 	}
 
+	/**
+	 * the output as a server side generator, so it is not uploaded
+	 * @param {string} channel 
+	 */
+	generator(channel) {
+		return { kind: "const", value: this.value, dims: this.dims };
+	}
+
 	async eval() {
 		const pinout = new graph.Pinout();
 		pinout.set("o", this.tensor);
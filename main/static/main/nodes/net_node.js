@@ -5,6 +5,10 @@ import * as csrf from "../csrf.js";
 import { Workspace } from "../workspace.js";
 
 
+// identifies this tab to the server, which diffs each /compute against the previous one
+// of the same session and only recomputes what changed
+const COMPUTE_SESSION = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
 class TargettedError extends Error {
 	/**
 	 * @param {NetworkNode} target 
@@ -44,6 +48,7 @@ class Request {
 			headers: {
 				'Content-Type': 'application/octet-stream',
 				'X-CSRFToken': csrf.get_csrf_token(),
+				'X-Compute-Session': COMPUTE_SESSION,
 			}
 		});
 		if (!resp.ok) {
@@ -66,8 +71,11 @@ class Request {
 	 * json: {
 	 *   nodes: [{endpoint: string, params: obj}],
 	 *   edges: [{
-	 *      // (tensor xor in_port) present
+	 *      // (tensor xor generator xor in_port) present
+	 *      // (the /shapes and /estimate endpoints also take ?shape: [number] instead of tensor)
 	 *      ?tensor: number,
+	 *      // const, zeros, uniform, normal, arange or linspace, see main/generators.py
+	 *      ?generator: {kind: string, ?dims: [number], ...params},
 	 *      ?in_port: {node: number, channel: string},  
 	 *      out_port: {node: number, channel: string},
 	 *   }],
@@ -116,6 +124,14 @@ class Request {
 								channel: e.out_port.channel,
 							},
 						});
+					} else if (typeof prev.generator === "function") {
+						obj.edges.push({
+							generator: prev.generator(e.in_port.channel),
+							out_port: {
+								node: this.mapping.get(node),
+								channel: e.out_port.channel,
+							},
+						});
 					} else {
 						obj.edges.push({
 							tensor: input_edges.length,
@@ -239,7 +255,7 @@ class Response {
 	 *   - magic: u32 = 0xdeadbeef,
 	 *   - data block count: u32,
 	 *   - json block byte size: u32,
-	 * json: {[{node: number, channel: string}]} // element with idx i is tensor in block i
+	 * json: {[{node: number, channel: string, shape: [number]}]} // element with idx i is tensor in block i
 	 * data block: (same as Request.encode)
 	 *   - byte size: u32
 	 *   - dim cnt: u32,
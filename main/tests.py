@@ -1,3 +1,535 @@
-from django.test import TestCase
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import struct
+import threading
+import time
+import numpy as np
+import torch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from django.core.management import CommandError, call_command
+from django.test import Client, SimpleTestCase, override_settings
 
-# Create your tests here.
+from main.admission import Admission, AdmissionError
+from main.context import Context, Model, ModelNode, context
+from main.gallery import Gallery, GalleryWriter
+from main.cost import Estimate
+from main.graph import Graph, Pinout
+from main.shapes import ShapeError, infer_shapes
+from main.traffic import Record, TrafficWriter, read_log
+from main.generators import Generator
+from main.incremental import ActivationCache, Activations
+from main.spatial import Range, Rect, Window, changed_rect, compute_rect, compute_tiled, out_shape, tile_bytes, window
+
+
+# Small random-weight networks covering the strides, paddings and dilations the
+# spatial helpers have to get right.
+def nets() -> list[torch.nn.Module]:
+    torch.manual_seed(0)
+    return [
+        torch.nn.Sequential(
+            torch.nn.Conv2d(3, 4, 3, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.MaxPool2d(2),
+            torch.nn.Conv2d(4, 4, 3, stride=2, padding=2, dilation=2),
+        ),
+        torch.nn.Sequential(
+            torch.nn.Conv2d(3, 4, (5, 3), stride=(1, 2), padding=(2, 0)),
+            torch.nn.MaxPool2d(3, stride=1, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.Conv2d(4, 2, 1),
+        ),
+        torch.nn.Sequential(
+            torch.nn.Conv2d(3, 4, 4, stride=3, padding=1, dilation=(1, 2)),
+            torch.nn.MaxPool2d(2, stride=2, padding=1, dilation=2),
+            torch.nn.Conv2d(4, 4, 3, padding=1, groups=2),
+        ),
+    ]
+
+def make_context(net: torch.nn.Module, name: str) -> tuple[Context, Model]:
+    # a context of its own, registering the nodes only (Model.register writes a graph file)
+    ctx = Context()
+    ctx.activations = ActivationCache(4, None)
+    model = Model(net, name)
+    ctx.register_model(model)
+    for node_name in model.list_node_names(): ModelNode(model, node_name).register(ctx)
+    return ctx, model
+
+def register(net: torch.nn.Module, name: str) -> Model:
+    # for the code that looks nodes up in the global context (shapes, views)
+    model = Model(net, name)
+    context().register_model(model)
+    for node_name in model.list_node_names(): ModelNode(model, node_name).register(context())
+    return model
+
+def encode_request(json_obj) -> bytes:
+    # a request without data blocks, see main/message.py
+    js = json.dumps(json_obj).encode()
+    size = 16 + len(js)
+    padding = (4 - size % 4) % 4
+    return struct.pack("<IIII", size + padding, 0x69babe69, 0, len(js)) + js + b"\0" * padding
+
+def outputs(ctx: Context, model: Model, x: torch.Tensor, session: str, incremental: bool = True) -> list[torch.Tensor]:
+    graph = model.build_graph(x)
+    ctx.compute_local(graph, session, incremental)
+    res = []
+    for n in graph.nodes:
+        y = n.get_pinout().get("o")
+        assert y is not None
+        res.append(y)
+    return res
+
+
+class WindowTest(SimpleTestCase):
+    def test_ranges_match_brute_force(self):
+        for k, s, p, d in itertools.product([1, 2, 3, 5], [1, 2, 3], [0, 1, 2], [1, 2]):
+            win = Window((k, k), (s, s), (p, p), (d, d), 0.0)
+            n = 17
+            out = win.out_size(0, n)
+            if out <= 0: continue
+            reads = [[o * s - p + d * j for j in range(k)] for o in range(out)]
+
+            for o in range(out):
+                r = win.in_range(0, Range(o, o + 1))
+                self.assertEqual((r.start, r.end), (min(reads[o]), max(reads[o]) + 1))
+
+            for start in range(n):
+                for end in range(start + 1, n + 1):
+                    # outputs whose kernel spans the range, including the gaps of a dilated one
+                    expected = [o for o in range(out) if min(reads[o]) < end and start <= max(reads[o])]
+                    r = win.out_range(0, Range(start, end), out)
+                    self.assertEqual(list(range(r.start, r.end)), expected, f"k={k} s={s} p={p} d={d} [{start}, {end})")
+
+    def test_compute_rect_matches_full(self):
+        for net in nets():
+            for sub in net:
+                win = window(sub)
+                assert win is not None
+                x = torch.rand(1, sub.in_channels if isinstance(sub, torch.nn.Conv2d) else 4, 19, 23)
+                with torch.no_grad():
+                    full = sub(x)
+                    h, w = full.shape[-2], full.shape[-1]
+                    for rows, cols in [((0, 1), (0, 1)), ((h - 2, h), (w - 3, w)), ((0, h), (1, 2)), ((0, h), (0, w))]:
+                        rect = Rect(Range(*rows), Range(*cols))
+                        got = compute_rect(sub, win, x, rect)
+                        torch.testing.assert_close(got, full[..., rows[0]:rows[1], cols[0]:cols[1]], rtol=0, atol=1e-6)
+
+
+class ChangedRectTest(SimpleTestCase):
+    def test_changed_rect(self):
+        x = torch.rand(2, 10, 12)
+        y = x.clone()
+        self.assertTrue(changed_rect(x, y).empty())
+        y[1, 0, 11] += 1
+        y[0, 4, 3] += 1
+        r = changed_rect(x, y)
+        self.assertEqual((r.rows.start, r.rows.end, r.cols.start, r.cols.end), (0, 5, 3, 12))
+        self.assertIsNone(changed_rect(x, y[..., :5]))
+
+
+class TiledTest(SimpleTestCase):
+    def test_tiles_match_full(self):
+        for net in nets():
+            for sub in net:
+                win = window(sub)
+                assert win is not None
+                x = torch.rand(2, sub.in_channels if isinstance(sub, torch.nn.Conv2d) else 4, 21, 26)
+                with torch.no_grad():
+                    full = sub(x)
+                    for tile in [1, 3, 8, 64]:
+                        out = torch.empty(out_shape(sub, win, x))
+                        peak = compute_tiled(sub, win, x, Rect.full(out), out, tile)
+                        self.assertLessEqual(peak, tile_bytes(sub, win, x.shape, tile))
+                        if isinstance(sub, torch.nn.Conv2d):
+                            torch.testing.assert_close(out, full, rtol=0, atol=1e-6)
+                        else:
+                            self.assertTrue(torch.equal(out, full), f"{sub} tile={tile}")
+
+    def test_tiled_model_matches_untiled(self):
+        for i, net in enumerate(nets()):
+            ctx, model = make_context(net, f"tiled{i}")
+            x = torch.rand(3, 45, 38)
+            full = outputs(ctx, model, x, "", incremental=False)
+            with override_settings(COMPUTE_TILE_SIZE=4):
+                tiled = outputs(ctx, model, x, "", incremental=False)
+                # incremental updates run tile by tile too
+                outputs(ctx, model, x.clone(), "s")
+                x[..., 40:45, 0:7] = 0
+                updated = outputs(ctx, model, x.clone(), "s")
+            for a, b in zip(tiled, full): torch.testing.assert_close(a, b, rtol=0, atol=1e-6)
+            for a, b in zip(updated, outputs(ctx, model, x, "", incremental=False)):
+                torch.testing.assert_close(a, b, rtol=0, atol=1e-5)
+
+
+class IncrementalTest(SimpleTestCase):
+    def test_matches_full_recompute(self):
+        edits = [
+            ((0, 1), (0, 1)),
+            ((32, 33), (28, 29)),
+            ((0, 33), (0, 2)),
+            ((10, 14), (5, 9)),
+            ((30, 33), (0, 29)),
+        ]
+        for i, net in enumerate(nets()):
+            ctx, model = make_context(net, f"incremental{i}")
+            # count the nodes that really went through the partial update
+            updated = []
+            update = model.update
+            model.update = lambda *args: updated.append(args[0]) or update(*args)
+            x = torch.rand(3, 33, 29)
+            outputs(ctx, model, x.clone(), "s")
+
+            for rows, cols in edits:
+                x[..., rows[0]:rows[1], cols[0]:cols[1]] = torch.rand(3, rows[1] - rows[0], cols[1] - cols[0])
+                got = outputs(ctx, model, x.clone(), "s")
+                full = outputs(ctx, model, x.clone(), "", incremental=False)
+                for a, b in zip(got, full):
+                    torch.testing.assert_close(a, b, rtol=0, atol=1e-5, msg=f"net {i}, edit {rows} {cols}")
+            self.assertNotEqual(len(updated), 0)
+
+    def test_session_key(self):
+        torch.manual_seed(0)
+        register(torch.nn.Sequential(torch.nn.Conv2d(1, 1, 3, padding=1)), "session")
+        body = encode_request({"nodes": [{"endpoint": "session:0", "params": {}}], "edges": [
+            {"generator": {"kind": "uniform", "dims": [1, 8, 8], "seed": 1}, "out_port": {"node": 0, "channel": "o"}},
+        ]})
+        ctx = context()
+        cache = ctx.activations
+        ctx.activations = ActivationCache(4, None)
+        try:
+            client = Client()
+            for tab in ["one", "two", None]:
+                headers = {} if tab is None else {"X-Compute-Session": tab}
+                res = client.post("/compute", body, content_type="application/octet-stream", headers=headers)
+                self.assertEqual(res.status_code, 200)
+            # one entry per tab, nothing for a request without a session
+            keys = [json.loads(k)[0] for k in ctx.activations.entries.keys()]
+            self.assertEqual(keys, ["tab:one", "tab:two"])
+        finally:
+            ctx.activations = cache
+
+    def test_bench_command(self):
+        torch.manual_seed(0)
+        model = register(nets()[0], "bench")
+        updated = []
+        update = model.update
+        model.update = lambda *args: updated.append(args[0]) or update(*args)
+        ctx = context()
+        cache = ctx.activations
+        ctx.activations = ActivationCache(0, 1)
+        out = io.StringIO()
+        try:
+            call_command("bench_incremental", model="bench", size=32, patch=[4], repeats=2, stdout=out)
+        finally:
+            ctx.activations = cache
+        row = out.getvalue().strip().split("\n")[-1].split()
+        self.assertEqual(row[0], "4")
+        self.assertLess(float(row[-1]), 1e-5)
+        self.assertNotEqual(len(updated), 0)
+
+    def test_unchanged_input_reuses_outputs(self):
+        ctx, model = make_context(nets()[0], "unchanged")
+        x = torch.rand(3, 16, 16)
+        first = outputs(ctx, model, x.clone(), "s")
+        second = outputs(ctx, model, x.clone(), "s")
+        for a, b in zip(first, second): self.assertIs(a, b)
+
+
+def cost(flops: int, peak_bytes: int = 0) -> Estimate:
+    res = Estimate()
+    res.flops = flops
+    res.peak_bytes = peak_bytes
+    return res
+
+
+@override_settings(
+    COMPUTE_MAX_UPLOAD_BYTES=100, COMPUTE_MAX_REQUEST_FLOPS=10, COMPUTE_MAX_REQUEST_BYTES=100,
+    COMPUTE_MAX_INFLIGHT_FLOPS=10, COMPUTE_MAX_INFLIGHT_BYTES=None, COMPUTE_QUEUE_TIMEOUT=5.0,
+)
+class AdmissionTest(SimpleTestCase):
+    def test_per_request_limits_are_413(self):
+        adm = Admission()
+        adm.check_upload(100)
+        for check in [lambda: adm.check_upload(101), lambda: adm.check_request(cost(11)), lambda: adm.check_request(cost(1, 101))]:
+            with self.assertRaises(AdmissionError) as e: check()
+            self.assertEqual(e.exception.status, 413)
+
+    @override_settings(COMPUTE_QUEUE_TIMEOUT=0.2)
+    def test_queue_timeout_is_429(self):
+        adm = Admission()
+        with adm.admit(cost(8)):
+            with self.assertRaises(AdmissionError) as e:
+                with adm.admit(cost(5)): pass
+            self.assertEqual(e.exception.status, 429)
+        # the timed out ticket does not block the queue
+        with adm.admit(cost(5)): pass
+
+    def test_cheapest_first(self):
+        adm = Admission()
+        order = []
+
+        def run(name: str, flops: int):
+            with adm.admit(cost(flops)): order.append(name)
+
+        threads = []
+        with adm.admit(cost(10)):
+            for name, flops in [("expensive", 9), ("cheap", 3)]:
+                t = threading.Thread(target=run, args=(name, flops))
+                t.start()
+                threads.append(t)
+                while len(adm.waiting) != len(threads): time.sleep(0.01)
+        for t in threads: t.join()
+        self.assertEqual(order, ["cheap", "expensive"])
+        self.assertEqual((adm.running, adm.flops, adm.bytes), (0, 0, 0))
+
+
+class ShapesTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        torch.manual_seed(0)
+        net = torch.nn.Sequential(torch.nn.Conv2d(3, 2, 3, padding=1), torch.nn.Flatten(0), torch.nn.Linear(128, 5))
+        cls.model = register(net, "shapes")
+
+    def graph(self, x: torch.Tensor) -> Graph:
+        return self.model.build_graph(x)
+
+    def test_infers_output_shapes(self):
+        shapes = infer_shapes(self.graph(torch.empty(3, 8, 8, device="meta")))
+        self.assertEqual(shapes.json(), [
+            {"node": 0, "channel": "o", "shape": [2, 8, 8]},
+            {"node": 1, "channel": "o", "shape": [128]},
+            {"node": 2, "channel": "o", "shape": [5]},
+        ])
+
+    def test_rejects_before_running(self):
+        computed = []
+        compute = self.model.compute
+        self.model.compute = lambda *args: computed.append(args[0]) or compute(*args)
+        try:
+            with self.assertRaises(ShapeError) as e:
+                infer_shapes(self.graph(torch.rand(3, 8, 9)))
+        finally:
+            self.model.compute = compute
+        self.assertIn("node 2 (shapes:2)", str(e.exception))
+        self.assertIn("o=[144]", str(e.exception))
+        self.assertEqual(computed, [])
+
+    def test_unknown_node(self):
+        graph = Graph()
+        graph.add_input(torch.rand(3), graph.add_node("no such node", {}), "o")
+        with self.assertRaises(ShapeError): infer_shapes(graph)
+
+    def test_shape_only_inputs(self):
+        body = encode_request({
+            "nodes": [{"endpoint": name, "params": {}} for name in self.model.list_node_names()],
+            "edges": [{"shape": [3, 8, 8], "out_port": {"node": 0, "channel": "o"}}] + [
+                {"in_port": {"node": i - 1, "channel": "o"}, "out_port": {"node": i, "channel": "o"}} for i in range(1, 3)
+            ],
+        })
+        client = Client()
+        res = client.post("/shapes", body, content_type="application/octet-stream")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()[-1], {"node": 2, "channel": "o", "shape": [5]})
+        # shapes carry no data, so they can not be computed
+        res = client.post("/compute", body, content_type="application/octet-stream")
+        self.assertEqual(res.status_code, 400)
+
+
+class EvaluateGraphTest(SimpleTestCase):
+    def test_outputs_without_batch_dim_are_rejected(self):
+        torch.manual_seed(0)
+        register(torch.nn.Sequential(torch.nn.Conv2d(3, 2, 3, padding=1)), "evaluate")
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(5):
+                Image.fromarray(np.full((8, 8, 3), i * 40, dtype=np.uint8)).save(os.path.join(tmp, f"{i}.png"))
+            graph = os.path.join(tmp, "graph.json")
+            with open(graph, "w") as f:
+                json.dump({"nodes": [
+                    {"instance": {"kind": "net_node", "endpoint": "evaluate:0", "params": {}}},
+                    {"instance": {"kind": "const", "value": 1, "dims": [3, 8, 8]}},
+                    {"instance": {"kind": "net_node", "endpoint": "evaluate:0", "params": {}}},
+                ], "edges": [{"in_port": {"node": 1, "channel": "o"}, "out_port": {"node": 2, "channel": "o"}}]}, f)
+
+            args = [graph, tmp, "--size", "8", "8", "--batch-size", "4", "--workers", "0"]
+            out = os.path.join(tmp, "out")
+            call_command("evaluate_graph", *args, "--out", out, "--output", "0:o", stdout=io.StringIO())
+            shard = np.load(os.path.join(out, "0_evaluate_0_o.npy"))
+            self.assertEqual(shard.shape, (5, 2, 8, 8))
+
+            # the const branch has no batch dim
+            with self.assertRaisesRegex(CommandError, r"output 1:o \(evaluate:0\) has shape \[2, 8, 8\]"):
+                call_command("evaluate_graph", *args, "--out", out, "--output", "2:o", stdout=io.StringIO())
+
+
+class GalleryTest(SimpleTestCase):
+    def test_search_and_k(self):
+        from main.nodes.gallery_node import GalleryNode
+
+        rng = np.random.default_rng(0)
+        v = rng.standard_normal((50, 8)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = GalleryWriter(tmp, 50, 8, "test", [f"{i}.png" for i in range(50)])
+            writer.write(0, v)
+            writer.close()
+            gallery = Gallery(tmp)
+            node = GalleryNode(gallery)
+
+            q = rng.standard_normal(8).astype(np.float32)
+            idx, scores = gallery.search(q, 3, "l2")
+            self.assertEqual(list(idx), list(np.argsort(((v - q) ** 2).sum(-1))[:3]))
+            self.assertEqual(scores.shape, (3,))
+
+            x = torch.from_numpy(q).reshape(8, 1, 1)
+            pinin = Pinout()
+            pinin.set("o", x)
+            out = node.compute({"k": "3"}, pinin)
+            self.assertEqual(list(out.get("i").shape), list(node.infer({"k": "3"}, pinin).get("i").shape))
+            self.assertEqual(out.get("i").shape[0], 3)
+            for k in ["0", "-2"]:
+                with self.assertRaisesRegex(Exception, "k must be at least 1"): node.decode_params({"k": k})
+            with self.assertRaises(Exception): node.decode_params({"metric": "dot"})
+
+
+def append_records(path: str, seed: int, count: int):
+    writer = TrafficWriter(path, None)
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        # incompressible bodies larger than a write buffer
+        body = rng.bytes(int(rng.integers(10_000, 100_000)))
+        writer.append(Record(seed + i / 1000, 0.0, 200, 0, body))
+
+
+class SlowCompute(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Set-Cookie", "csrftoken=token")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(0.2)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TrafficTest(SimpleTestCase):
+    def test_concurrent_writers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "log")
+            ctx = multiprocessing.get_context("fork")
+            procs = [ctx.Process(target=append_records, args=(path, seed, 200)) for seed in range(8)]
+            for p in procs: p.start()
+            for p in procs: p.join()
+            records = list(read_log(path))
+            self.assertEqual(len(records), 1600)
+            self.assertEqual(sorted([int(r.time) for r in records]), sorted([seed for seed in range(8) for _ in range(200)]))
+
+    def test_size_limit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "log")
+            writer = TrafficWriter(path, 200)
+            self.assertTrue(writer.append(Record(0.0, 0.0, 200, 0, b"x" * 10)))
+            self.assertFalse(writer.append(Record(1.0, 0.0, 200, 0, os.urandom(300))))
+            self.assertEqual(len(list(read_log(path))), 1)
+
+    def test_replay_counts_queueing(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SlowCompute)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "log")
+                writer = TrafficWriter(path, None)
+                # written in completion order, the replay sends them in start order
+                for t in [10.02, 10.0, 10.01]: writer.append(Record(t, 0.2, 200, 0, b"body"))
+                out = io.StringIO()
+                call_command("replay_compute", path, "--url", f"http://127.0.0.1:{server.server_port}/",
+                             "--concurrency", "1", stdout=out)
+        finally:
+            server.shutdown()
+        rows = {line.split()[0]: line.split()[1:] for line in out.getvalue().split("\n")[2:] if line.strip() != ""}
+        # one slot for three requests due at once: the last one waits for the other two
+        self.assertGreater(float(rows["replayed"][-1].removesuffix("ms")), 550)
+        self.assertGreater(float(rows["queued"][-1].removesuffix("ms")), 350)
+
+
+class GeneratorTest(SimpleTestCase):
+    def test_kinds(self):
+        cases = [
+            ({"kind": "const", "value": 0.5, "dims": [3, 4]}, torch.full((3, 4), 0.5)),
+            ({"kind": "zeros", "dims": [2, 2]}, torch.zeros(2, 2)),
+            ({"kind": "arange", "start": 1, "end": 7, "step": 2, "dims": [2, 3]}, torch.tensor([[1.0, 3, 5], [1, 3, 5]])),
+            ({"kind": "linspace", "start": 0, "end": 1, "steps": 3}, torch.tensor([0.0, 0.5, 1.0])),
+        ]
+        for spec, expected in cases:
+            g = Generator(spec)
+            t = g.materialize()
+            self.assertEqual(t.shape, g.shape())
+            self.assertTrue(torch.equal(t, expected), spec)
+
+        # constants are one value expanded to the full shape
+        t = Generator({"kind": "const", "value": 1, "dims": [1000, 1000]}).materialize()
+        self.assertEqual(t.untyped_storage().nbytes(), 4)
+
+        for kind in ["uniform", "normal"]:
+            spec = {"kind": kind, "dims": [4, 5], "seed": 3}
+            a, b = Generator(spec).materialize(), Generator(spec).materialize()
+            self.assertTrue(torch.equal(a, b))
+            self.assertFalse(torch.equal(a, Generator(dict(spec, seed=4)).materialize()))
+        t = Generator({"kind": "uniform", "dims": [1000], "seed": 0, "low": -2, "high": -1}).materialize()
+        self.assertTrue(bool(((t >= -2) & (t <= -1)).all()))
+
+    def test_invalid(self):
+        for spec in [
+            {"kind": "nope", "dims": [1]},
+            {"kind": "const"},
+            {"kind": "zeros", "dims": [-1]},
+            {"kind": "arange", "start": 0, "end": 5, "dims": [2, 4]},
+            {"kind": "arange", "start": 0, "end": 5, "step": 0},
+        ]:
+            with self.assertRaises(Exception, msg=str(spec)): Generator(spec)
+
+    def test_cached_without_their_tensor(self):
+        ctx, _ = make_context(torch.nn.Sequential(torch.nn.ReLU()), "generated")
+        spec = {"kind": "const", "value": 2, "dims": [3, 500, 500]}
+
+        def run():
+            graph = Graph()
+            node = graph.add_node("generated:0", {})
+            graph.add_generator(Generator(spec), node, "o")
+            ctx.compute_local(graph, "s")
+            return graph
+
+        graph = run()
+        act = Activations(graph)
+        self.assertEqual(act.inputs, {})
+        self.assertEqual(act.generators, {(0, "o"): spec})
+        # only the relu output, the 3M element input is one expanded value
+        self.assertEqual(act.nbytes(), 4 * 3 * 500 * 500)
+        y = graph.nodes[0].get_pinout().get("o")
+        # the same spec again reuses the cached output
+        self.assertIs(run().nodes[0].get_pinout().get("o"), y)
+
+    def test_nbytes_counts_shared_storage_once(self):
+        graph = Graph()
+        a = graph.add_node("a", {})
+        b = graph.add_node("b", {})
+        x = torch.zeros(100)
+        out = Pinout()
+        out.set("o", x)
+        out.set("v", x[10:20])
+        a.set_pinout(out)
+        out = Pinout()
+        out.set("o", torch.zeros(1).expand(1000))
+        b.set_pinout(out)
+        self.assertEqual(Activations(graph).nbytes(), 400 + 4)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+from contextlib import contextmanager
+import os
+import threading
+import logging
+import torch
+
+logger = logging.getLogger(__name__)
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"): return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def numa_nodes() -> list[set[int]]:
+    # linux only, an empty list means no NUMA info (or a single node)
+    root = "/sys/devices/system/node"
+    if not os.path.isdir(root): return []
+
+    res = []
+    for name in sorted(os.listdir(root)):
+        if not name.startswith("node") or not name[4:].isdigit(): continue
+        cpus = set()
+        with open(os.path.join(root, name, "cpulist")) as f:
+            for part in f.read().strip().split(","):
+                if part == "": continue
+                if "-" in part:
+                    a, b = part.split("-")
+                    cpus.update(range(int(a), int(b) + 1))
+                else:
+                    cpus.add(int(part))
+        if len(cpus) != 0: res.append(cpus)
+    return res
+
+def pin_to_numa_node(index: int) -> int | None:
+    nodes = numa_nodes()
+    if len(nodes) < 2 or not hasattr(os, "sched_setaffinity"): return None
+    node = index % len(nodes)
+    os.sched_setaffinity(0, nodes[node])
+    logger.info("pinned pid %d to numa node %d", os.getpid(), node)
+    return node
+
+def workers_on_node(node: int, size: int) -> int:
+    # workers are pinned round robin, see pin_to_numa_node
+    count = len(numa_nodes())
+    return len([i for i in range(size) if i % count == node])
+
+
+# Splits the cores between the requests that are computing at the same time.
+# torch.set_num_threads is per OS thread on OpenMP builds, so every request thread
+# re-applies its share before each node, which also adapts to requests coming and going.
+class ThreadBudget:
+    def __init__(self, cores: int, enabled: bool = True):
+        self.cores = cores
+        self.enabled = enabled
+        self.active = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def request(self):
+        with self.lock: self.active += 1
+        try:
+            yield self
+        finally:
+            with self.lock: self.active -= 1
+
+    def threads(self) -> int:
+        if not self.enabled: return self.cores
+        with self.lock: active = max(1, self.active)
+        return max(1, self.cores // active)
+
+    def apply(self):
+        n = self.threads()
+        if torch.get_num_threads() != n: torch.set_num_threads(n)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+from typing import Iterator
+import os
+import struct
+import zlib
+
+# Append-only log of /compute requests:
+#   file header: magic u32, version u32
+#   record: magic u32, time f64 (unix), duration f64 (s), status u32,
+#           response size u32, body size u32, compressed size u32, zlib(body)
+FILE_MAGIC = 0x7ea1f11e
+RECORD_MAGIC = 0x7ec0bd01
+VERSION = 1
+HEADER = struct.Struct("<II")
+RECORD = struct.Struct("<IddIIII")
+
+
+class Record:
+    def __init__(self, time: float, duration: float, status: int, response_size: int, body: bytes):
+        self.time = time
+        self.duration = duration
+        self.status = status
+        self.response_size = response_size
+        self.body = body
+
+
+# Several server processes may append to the same log: every record is one unbuffered
+# write to an O_APPEND fd, which the OS does not interleave with other appends.
+class TrafficWriter:
+    def __init__(self, path: str, max_bytes: int | None):
+        self.path = path
+        self.max_bytes = max_bytes
+        if not os.path.exists(path):
+            # the header is in place before anyone can append, whoever creates the file first
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f: f.write(HEADER.pack(FILE_MAGIC, VERSION))
+            try: os.link(tmp, path)
+            except FileExistsError: pass
+            finally: os.remove(tmp)
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+
+    def append(self, rec: Record) -> bool:
+        # False once the log is full; the size is that of the file, shared by all writers
+        data = zlib.compress(rec.body, 1)
+        header = RECORD.pack(RECORD_MAGIC, rec.time, rec.duration, rec.status, rec.response_size, len(rec.body), len(data))
+        if self.max_bytes is not None and os.fstat(self.fd).st_size + len(header) + len(data) > self.max_bytes: return False
+        os.write(self.fd, header + data)
+        return True
+
+
+def read_log(path: str) -> Iterator[Record]:
+    with open(path, "rb") as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != FILE_MAGIC or version != VERSION: raise Exception(f"{path} is not a traffic log")
+        while True:
+            header = f.read(RECORD.size)
+            # a record cut short by a crash ends the log
+            if len(header) < RECORD.size: break
+            magic, time, duration, status, response_size, size, compressed = RECORD.unpack(header)
+            if magic != RECORD_MAGIC: raise Exception(f"{path}: corrupt record at {f.tell() - RECORD.size}")
+            data = f.read(compressed)
+            if len(data) < compressed: break
+            body = zlib.decompress(data)
+            assert len(body) == size
+            yield Record(time, duration, status, response_size, body)
@@ -9,6 +9,10 @@ urlpatterns = [
     django_path("list_graphs", views.list_graphs, name="list_graphs"),
     django_path("load_graph/<str:name>", views.load_graph, name="load_graph"),
     django_path("compute", views.compute, name="compute"),
+    django_path("shapes", views.compute_shapes, name="shapes"),
+    django_path("estimate", views.compute_estimate, name="estimate"),
+    django_path("gallery_image/<str:name>/<int:index>", views.gallery_image, name="gallery_image"),
+    django_path("workers", views.workers, name="workers"),
     django_path("description/<str:name>", views.description, name="description"),
     django_path("contents/<str:name>", views.contents, name="contents"),
 ]
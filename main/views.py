@@ -7,6 +7,9 @@ import logging
 import os
 from main.message import Request, Response
 from main.context import context
+from main.cost import estimate
+from main.shapes import infer_shapes
+from main.admission import AdmissionError, admission
 
 logger = logging.getLogger(__name__)
 
@@ -27,16 +30,74 @@ def contents(http_req: http.HttpRequest, name: str) -> http.HttpResponse:
     except Exception as e:
         return http.HttpResponseBadRequest(str(e).encode())
 
+def compute_session(http_req: http.HttpRequest) -> str | None:
+    # Incremental compute diffs against the previous request of the same session. The page
+    # sends a random id per tab (X-Compute-Session), so tabs of one browser and clients
+    # behind one address (proxy, NAT) do not overwrite each other's activations.
+    # Without it the django session is used, and without that nothing is cached.
+    tab = http_req.headers.get("X-Compute-Session", "")
+    if tab != "" and len(tab) <= 64: return "tab:" + tab
+    key = http_req.session.session_key
+    if key is not None: return "session:" + key
+    return None
+
 def compute(http_req: http.HttpRequest):
     try:
+        # checked before the body is read, so an oversized upload is never buffered
+        admission().check_upload(int(http_req.META.get("CONTENT_LENGTH") or 0))
         req = Request()
         req.decode(http_req.body)
         logger.debug("%s", req.graph.__str__())
-        context().compute(req.graph)
+        shapes = infer_shapes(req.graph)
+        cost = estimate(req.graph, shapes, len(http_req.body))
+        with admission().admit(cost):
+            context().compute(req.graph, compute_session(http_req))
         logger.debug("%s", req.graph.__str__())
 
         resp = Response(req.graph)
-        return http.HttpResponse(resp.encode())
+        res = http.HttpResponse(resp.encode())
+        res["X-Compute-Estimate"] = str(cost)
+        return res
+    except AdmissionError as e:
+        logger.warning("rejected: %s", e)
+        return http.HttpResponse(str(e).encode(), status=e.status)
+    except Exception as e:
+        logger.error(e)
+        return http.HttpResponseBadRequest(str(e).encode())
+
+def compute_estimate(http_req: http.HttpRequest):
+    try:
+        req = Request()
+        req.decode(http_req.body, allow_shapes=True)
+        cost = estimate(req.graph, infer_shapes(req.graph), len(http_req.body))
+        return http.JsonResponse(cost.json())
+    except Exception as e:
+        logger.error(e)
+        return http.HttpResponseBadRequest(str(e).encode())
+
+def compute_shapes(http_req: http.HttpRequest):
+    try:
+        req = Request()
+        req.decode(http_req.body, allow_shapes=True)
+        return http.JsonResponse(infer_shapes(req.graph).json(), safe=False)
+    except Exception as e:
+        logger.error(e)
+        return http.HttpResponseBadRequest(str(e).encode())
+
+def workers(req: http.HttpRequest) -> http.HttpResponse:
+    _ = req
+    pool = context().get_pool()
+    if pool is None: return http.JsonResponse([], safe=False)
+    # only reports, the pool pings and restarts its workers in the background
+    return http.JsonResponse(pool.health(), safe=False)
+
+def gallery_image(req: http.HttpRequest, name: str, index: int) -> http.HttpResponse | http.FileResponse:
+    _ = req
+    try:
+        # only the images listed in the gallery can be read
+        node = context().get_node("gallery:" + name)
+        path = node.gallery.images[index]
+        return http.FileResponse(open(path, "rb"))
     except Exception as e:
         logger.error(e)
         return http.HttpResponseBadRequest(str(e).encode())
@@ -0,0 +1,233 @@
+from __future__ import annotations
+import os
+import queue
+import threading
+import time
+from typing import Dict
+import logging
+import torch.multiprocessing as mp
+
+from main.graph import Graph, Pinout
+from main.threads import pin_to_numa_node, workers_on_node
+
+logger = logging.getLogger(__name__)
+
+# Tensors sent through torch.multiprocessing queues are moved into shared memory
+# and only their handles are pickled, so inputs/outputs are never copied through a pipe.
+
+def worker_main(index: int, size: int, requests: mp.Queue, responses: mp.Queue):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "interactive.settings")
+    import django
+    from django.conf import settings
+    django.setup()
+    node = pin_to_numa_node(index) if settings.COMPUTE_NUMA_PIN else None
+    # importing the context scans the node dirs, so the models are loaded once per worker
+    from main.context import context
+
+    ctx = context()
+    # the workers run one graph at a time each, so they split the cores between themselves;
+    # a pinned worker only sees its node's cores, which it shares with the others pinned there
+    sharing = size if node is None else workers_on_node(node, size)
+    ctx.budget.cores = max(1, ctx.budget.cores // sharing)
+    # every worker keeps its own activations (in shared memory), so they split that budget too
+    if ctx.activations.max_bytes is not None: ctx.activations.max_bytes //= size
+    responses.put(("ready", os.getpid()))
+
+    while True:
+        msg = requests.get()
+        kind = msg[0]
+        if kind == "stop": break
+        elif kind == "ping":
+            responses.put(("pong", msg[1]))
+        elif kind == "compute":
+            job, graph, session = msg[1], msg[2], msg[3]
+            try:
+                ctx.compute_local(graph, session)
+                outputs = []
+                for node in graph.nodes:
+                    for ch, t in node.get_pinout().pinout.items():
+                        outputs.append((node.index, ch, t.share_memory_()))
+                responses.put(("done", job, outputs))
+            except Exception as e:
+                responses.put(("error", job, str(e)))
+
+
+class WorkerError(Exception):
+    pass
+
+
+class Worker:
+    def __init__(self, index: int, size: int, startup_timeout: float):
+        self.index = index
+        self.size = size
+        self.startup_timeout = startup_timeout
+        self.jobs = 0
+        self.restarts = 0
+        self.busy = False
+        # result and time of the last health check ping, None until the first one
+        self.responsive: bool | None = None
+        self.checked: float | None = None
+        self.spawn()
+
+    def spawn(self):
+        ctx = mp.get_context("spawn")
+        self.requests = ctx.Queue()
+        self.responses = ctx.Queue()
+        self.process = ctx.Process(target=worker_main, args=(self.index, self.size, self.requests, self.responses), daemon=True)
+        self.process.start()
+
+    def wait_ready(self, timeout: float):
+        self.wait_for("ready", None, timeout)
+        logger.info("worker %d started: pid=%d", self.index, self.process.pid)
+
+    def start(self):
+        self.spawn()
+        self.wait_ready(self.startup_timeout)
+
+    def stop(self):
+        if self.process.is_alive():
+            self.requests.put(("stop",))
+            self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def restart(self):
+        logger.warning("restarting worker %d (exitcode=%s)", self.index, self.process.exitcode)
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def wait_for(self, kind: str, job: int | None, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0: raise WorkerError(f"worker {self.index}: timed out waiting for '{kind}'")
+            try:
+                msg = self.responses.get(timeout=min(left, 0.5))
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise WorkerError(f"worker {self.index} died (exitcode={self.process.exitcode})")
+                continue
+
+            if msg[0] == "error" and msg[1] == job: raise Exception(msg[2])
+            # stale replies from a previous job or ping are dropped
+            if msg[0] == kind and (job is None or msg[1] == job): return msg
+
+    def ping(self, timeout: float) -> bool:
+        if not self.is_alive(): return False
+        token = time.monotonic_ns()
+        self.requests.put(("ping", token))
+        try:
+            self.wait_for("pong", token, timeout)
+            return True
+        except WorkerError:
+            return False
+
+    def compute(self, graph: Graph, session: str | None, timeout: float):
+        self.jobs += 1
+        job = self.jobs
+        self.requests.put(("compute", job, graph, session))
+        _, _, outputs = self.wait_for("done", job, timeout)
+
+        pinouts: Dict[int, Pinout] = {}
+        for index, ch, t in outputs:
+            if index not in pinouts: pinouts[index] = Pinout()
+            pinouts[index].set(ch, t)
+        for index, pinout in pinouts.items():
+            graph.nodes[index].set_pinout(pinout)
+
+    def health(self) -> Dict:
+        return {
+            "index": self.index,
+            "pid": self.process.pid,
+            "alive": self.is_alive(),
+            "jobs": self.jobs,
+            "restarts": self.restarts,
+            "busy": self.busy,
+            "responsive": self.responsive,
+            "checked": self.checked,
+        }
+
+
+class WorkerPool:
+    def __init__(self, size: int, timeout: float, startup_timeout: float, check_interval: float):
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        # all processes load django and the models at the same time, so startup takes
+        # about as long as one worker instead of size of them
+        self.workers = [Worker(i, size, startup_timeout) for i in range(size)]
+        deadline = time.monotonic() + startup_timeout
+        try:
+            for w in self.workers: w.wait_ready(max(0.0, deadline - time.monotonic()))
+        except BaseException:
+            self.stop()
+            raise
+        self.idle: queue.Queue[Worker] = queue.Queue()
+        for w in self.workers: self.idle.put(w)
+
+        self.stopped = threading.Event()
+        self.monitor: threading.Thread | None = None
+        if check_interval > 0:
+            self.monitor = threading.Thread(target=self.check_loop, args=(check_interval,), daemon=True)
+            self.monitor.start()
+
+    def take(self, block: bool = True) -> Worker | None:
+        try:
+            worker = self.idle.get(block)
+        except queue.Empty:
+            return None
+        worker.busy = True
+        return worker
+
+    def give_back(self, worker: Worker):
+        worker.busy = False
+        self.idle.put(worker)
+
+    def compute(self, graph: Graph, session: str | None = None):
+        worker = self.take()
+        assert worker is not None
+        try:
+            if not worker.is_alive(): worker.restart()
+            worker.compute(graph, session, self.timeout)
+        except WorkerError:
+            # a crashed or hung worker can not be trusted with the next request
+            worker.restart()
+            raise
+        finally:
+            self.give_back(worker)
+
+    def check_loop(self, interval: float, timeout: float = 1.0):
+        # pings one idle worker at a time, so at most one worker is kept from /compute;
+        # busy ones share their reply queue with a running job and are skipped
+        while not self.stopped.wait(interval):
+            for _ in range(len(self.workers)):
+                worker = self.take(block=False)
+                if worker is None: break
+                try:
+                    worker.responsive = worker.ping(timeout)
+                    worker.checked = time.time()
+                    if not worker.responsive:
+                        worker.restart()
+                        worker.responsive = True
+                except Exception as e:
+                    # compute restarts a dead worker again before using it
+                    logger.error("worker %d: restart failed: %s", worker.index, e)
+                finally:
+                    self.give_back(worker)
+
+    def health(self) -> list[Dict]:
+        return [w.health() for w in self.workers]
+
+    def stop(self):
+        self.stopped.set()
+        if self.monitor is not None: self.monitor.join(5.0)
+        for w in self.workers: w.stop()
+
+
+def start_pool(size: int, timeout: float, startup_timeout: float, check_interval: float) -> WorkerPool:
+    logger.info("starting %d compute workers", size)
+    return WorkerPool(size, timeout, startup_timeout, check_interval)
@@ -29,7 +29,7 @@ class VggModel(Model):
         return json_obj
 
     def list_node_names(self):
-        l = super().list_node_names()
+        l = list(super().list_node_names())
         l.insert(0, "vgg16:transform")
         l.insert(33, "vgg16:flatten")
         return l
@@ -41,7 +41,8 @@ class VggModel(Model):
             trans = self.weights.transforms()
             y = trans(x)
         elif node_name == "vgg16:flatten":
-            y = torch.flatten(x)
+            # keep a leading batch dim, [N, C, H, W] -> [N, C*H*W]
+            y = torch.flatten(x, start_dim=max(0, x.dim() - 3))
         else: return super().compute(node_name, pinin)
 
         assert isinstance(y, torch.Tensor)
@@ -49,6 +50,18 @@ class VggModel(Model):
         res.set("o", y)
         return res
 
+    def infer(self, node_name: str, pinin: Pinout) -> Pinout:
+        x = pinin.get("o")
+        assert x is not None
+        if node_name != "vgg16:transform": return super().infer(node_name, pinin)
+
+        # the transform looks at the data, so compute the crop size by hand
+        crop = list(self.weights.transforms().crop_size)
+        if len(crop) == 1: crop = crop * 2
+        res = Pinout()
+        res.set("o", torch.empty(list(x.shape[:-2]) + crop, device="meta"))
+        return res
+
     def contents(self, node_name: str):
         if node_name == "vgg16:transform":
             return f"<p>{node_name}</p>"